@@ -0,0 +1,43 @@
+# Скорость расчета назначений (без базы): матрица расстояний + greedy / Hungarian
+#   python -m benchmarks.dispatch --orders 500 --couriers 500
+import argparse
+import time
+
+import numpy as np
+
+from glovo_app import dispatch
+from benchmarks.seed import CENTER, SPREAD
+
+
+def random_points(rng, count):
+    return np.column_stack([rng.normal(CENTER[0], SPREAD[0], count), rng.normal(CENTER[1], SPREAD[1], count)])
+
+
+def run(method, orders, couriers, repeat):
+    timings = []
+    pairs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        pairs = dispatch.match(orders, couriers, method=method)
+        timings.append(time.perf_counter() - start)
+    best = min(timings)
+    distances = dispatch.distance_matrix(orders, couriers)
+    total_km = sum(distances[i, j] for i, j in pairs)
+    print(f'{method:<8} assigned={len(pairs):5d} best={best * 1000:8.2f}ms '
+          f'assignments/sec={len(pairs) / best:10.0f} total_km={total_km:9.1f}')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--orders', type=int, default=500)
+    parser.add_argument('--couriers', type=int, default=500)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    rng = np.random.default_rng(42)
+    order_points = random_points(rng, args.orders)
+    courier_points = random_points(rng, args.couriers)
+    run('greedy', order_points, courier_points, args.repeat)
+    if dispatch.linear_sum_assignment is not None:
+        run('optimal', order_points, courier_points, args.repeat)
+    else:
+        print('optimal  skipped: scipy is not installed')
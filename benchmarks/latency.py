@@ -0,0 +1,69 @@
+# Замер p50/p99 под конкуренцией на запущенном сервере:
+#   python -m benchmarks.latency --url http://127.0.0.1:8080 --concurrency 100 --requests 2000
+# Запускать до и после изменения (git stash / git checkout) и сравнивать вывод.
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+PATHS = ['/store/store/', '/order/order/']
+
+
+def percentile(values, q):
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))
+    return values[index]
+
+
+async def measure(client: httpx.AsyncClient, next_request, concurrency: int, total: int):
+    # next_request() -> (path, headers); возвращает задержки в мс, число ответов >= 400 и общее время в секундах
+    latencies = []
+    errors = 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        nonlocal errors
+        path, headers = next_request()
+        async with semaphore:
+            start = time.perf_counter()
+            response = await client.get(path, headers=headers)
+            latencies.append((time.perf_counter() - start) * 1000)
+            if response.status_code >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(total)))
+    return latencies, errors, time.perf_counter() - started
+
+
+async def run_path(client: httpx.AsyncClient, path: str, concurrency: int, total: int):
+    latencies, errors, elapsed = await measure(client, lambda: (path, None), concurrency, total)
+    return {
+        'path': path,
+        'rps': total / elapsed,
+        'p50': percentile(latencies, 50),
+        'p99': percentile(latencies, 99),
+        'mean': statistics.mean(latencies),
+        'errors': errors,
+    }
+
+
+async def main(url: str, concurrency: int, total: int, paths):
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=60) as client:
+        for path in paths:
+            result = await run_path(client, path, concurrency, total)
+            print(f"{result['path']:<24} rps={result['rps']:8.1f} p50={result['p50']:8.2f}ms "
+                  f"p99={result['p99']:8.2f}ms mean={result['mean']:8.2f}ms errors={result['errors']}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--url', default='http://127.0.0.1:8080')
+    parser.add_argument('--concurrency', type=int, default=100)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--path', action='append', dest='paths')
+    args = parser.parse_args()
+    asyncio.run(main(args.url, args.concurrency, args.requests, args.paths or PATHS))
@@ -0,0 +1,58 @@
+# Пропускная способность login-хеширования на один воркер и задержка event loop во время нагрузки:
+#   python -m benchmarks.password_hashing --logins 64
+# inline  — bcrypt прямо в event loop (как было раньше)
+# pool    — через glovo_app.password_pool.run_hashing
+import argparse
+import asyncio
+import time
+
+from passlib.context import CryptContext
+
+from glovo_app.password_pool import run_hashing, stats
+
+password_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+
+async def heartbeat(stop: asyncio.Event, interval: float = 0.01):
+    # насколько опаздывает тик — столько же ждал бы любой запрос меню
+    worst = 0.0
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        worst = max(worst, time.perf_counter() - start - interval)
+    return worst
+
+
+async def inline_verify(password, hashed):
+    return password_context.verify(password, hashed)
+
+
+async def pool_verify(password, hashed):
+    return await run_hashing(password_context.verify, password, hashed)
+
+
+async def run(mode, verify, logins, hashed):
+    stop = asyncio.Event()
+    ticker = asyncio.create_task(heartbeat(stop))
+    await asyncio.sleep(0)
+    start = time.perf_counter()
+    await asyncio.gather(*(verify('secret-password', hashed) for _ in range(logins)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    lag = await ticker
+    print(f'{mode:<7} logins={logins} elapsed={elapsed:6.2f}s throughput={logins / elapsed:7.1f}/s '
+          f'max_loop_lag={lag * 1000:8.1f}ms')
+
+
+async def main(logins):
+    hashed = password_context.hash('secret-password')
+    await run('inline', inline_verify, logins, hashed)
+    await run('pool', pool_verify, logins, hashed)
+    print(f"pool workers={stats['workers']} rejected={stats['rejected']}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--logins', type=int, default=64)
+    args = parser.parse_args()
+    asyncio.run(main(args.logins))
@@ -1,10 +1,18 @@
 from sqladmin import ModelView
 from glovo_app.db.models import UserProfile, Category
+from glovo_app.token_cache import token_cache
 
 
 class UserProfileAdmin(ModelView, model=UserProfile):
     column_list = [UserProfile.id, UserProfile.username, UserProfile.role]
 
+    # роль, пароль или сам пользователь поменялись — закешированный get_current_user больше не верен
+    async def after_model_change(self, data, model, is_created, request):
+        token_cache.invalidate_user(model.id)
+
+    async def after_model_delete(self, model, request):
+        token_cache.invalidate_user(model.id)
+
 
 class CategoryAdmin(ModelView, model=Category):
     column_list = [Category.id, Category.category_name]
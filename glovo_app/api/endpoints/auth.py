@@ -1,14 +1,19 @@
 from glovo_app.db.schema import UserProfileSchema
-from glovo_app.db.models import UserProfile, RefreshToken
+from glovo_app.db.models import UserProfile
 from fastapi import Depends, HTTPException, status, APIRouter
-from sqlalchemy.orm import Session
-from glovo_app.db.database import SessionLocal
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from glovo_app.db.database import get_db
+from glovo_app.password_pool import run_hashing
+from glovo_app.token_cache import token_cache
+from glovo_app.refresh_tokens import consume_refresh_token, store_refresh_token, revoke_user_tokens
 
 from glovo_app.config import SECRET_KEY, ACCESS_TOKEN_EXPIRE_MINUTES, REFRESH_TOKEN_EXPIRE_DAYS, ALGORITHM
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from passlib.context import CryptContext
-from jose import jwt
+from jose import jwt, JWTError
 from datetime import datetime, timedelta
+from uuid import uuid4
 from fastapi_limiter.depends import RateLimiter
 from passlib.hash import bcrypt
 
@@ -36,31 +41,54 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None):
 
 
 def create_refesh_token(data: dict):
-    return create_access_token(data, expires_delta=timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS))
+    # jti чтобы два логина в одну секунду не дали одинаковый токен
+    return create_access_token({**data, 'type': 'refresh', 'jti': uuid4().hex},
+                               expires_delta=timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS))
 
 
-def verify_password(plain_password, hashed_password):
-    return password_context.verify(plain_password, hashed_password)
+async def verify_password(plain_password, hashed_password):
+    return await run_hashing(password_context.verify, plain_password, hashed_password)
 
 
-def get_password_hash(password):
-    return password_context.hash(password)
+async def get_password_hash(password):
+    return await run_hashing(password_context.hash, password)
 
 
-def get_db():
-    db = SessionLocal()
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)):
+    user = token_cache.get(token)
+    if user is not None:
+        return user
+
+    credentials_exception = HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Маалымат туура эмес',
+                                          headers={'WWW-Authenticate': 'Bearer'})
     try:
-        yield db
-    finally:
-        db.close()
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        raise credentials_exception
+    username = payload.get('sub')
+    if username is None or payload.get('type') == 'refresh':
+        raise credentials_exception
+
+    user_db = await db.scalar(select(UserProfile).where(UserProfile.username == username))
+    if user_db is None:
+        raise credentials_exception
+    user = UserProfileSchema(id=user_db.id, first_name=user_db.first_name, last_name=user_db.last_name,
+                             username=user_db.username, phone_number=user_db.phone_number, role=user_db.role)
+    token_cache.set(token, payload['exp'], user)
+    return user
+
+
+@auth_router.get('/me/', response_model=UserProfileSchema)
+async def me(current_user: UserProfileSchema = Depends(get_current_user)):
+    return current_user
 
 
 @auth_router.post('/register/')
-async def register(user: UserProfileSchema, db: Session = Depends(get_db)):
-    user_db = db.query(UserProfile).filter(UserProfile.username == user.username).first()
+async def register(user: UserProfileSchema, db: AsyncSession = Depends(get_db)):
+    user_db = await db.scalar(select(UserProfile).where(UserProfile.username == user.username))
     if user_db:
         raise HTTPException(status_code=400, detail='username бар экен')
-    new_hash_pass = get_password_hash(user.password)
+    new_hash_pass = await get_password_hash(user.password)
     new_user = UserProfile(
         first_name=user.first_name,
         last_name=user.last_name,
@@ -70,31 +98,56 @@ async def register(user: UserProfileSchema, db: Session = Depends(get_db)):
         hashed_password=new_hash_pass
     )
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
+    await db.refresh(new_user)
     return {"message": 'Saved'}
 
 
 @auth_router.post('/login', dependencies=[Depends(RateLimiter(times=3, seconds=200))])
-async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
-    user = db.query(UserProfile).filter(UserProfile.username == form_data.username).first()
-    if not user or not verify_password(form_data.password, user.hashed_password):
+async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_db)):
+    user = await db.scalar(select(UserProfile).where(UserProfile.username == form_data.username))
+    if not user or not await verify_password(form_data.password, user.hashed_password):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Маалымат туура эмес')
     access_token = create_access_token({'sub': user.username})
     refresh_token = create_refesh_token({'sub': user.username})
 
-    user_db = RefreshToken(token=refresh_token, user_id=user.id)
-    db.add(user_db)
-    db.commit()
+    await store_refresh_token(db, user.id, refresh_token)
+    await db.commit()
 
     return {'access_token': access_token, 'refresh_token': refresh_token, 'token_type': 'bearer'}
 
 
+@auth_router.post('/refresh/')
+async def refresh(refresh_token: str, db: AsyncSession = Depends(get_db)):
+    credentials_exception = HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Маалымат туура эмес')
+    try:
+        payload = jwt.decode(refresh_token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        raise credentials_exception
+    if payload.get('type') != 'refresh':
+        raise credentials_exception
+
+    user_id = await consume_refresh_token(db, refresh_token)
+    if user_id is None:
+        # валидная подпись, но токена нет в базе — его уже использовали, отзываем все сессии пользователя
+        user = await db.scalar(select(UserProfile).where(UserProfile.username == payload.get('sub')))
+        if user is not None:
+            await revoke_user_tokens(db, user.id)
+            await db.commit()
+        raise credentials_exception
+
+    access_token = create_access_token({'sub': payload['sub']})
+    new_refresh_token = create_refesh_token({'sub': payload['sub']})
+    await store_refresh_token(db, user_id, new_refresh_token)
+    await db.commit()
+
+    return {'access_token': access_token, 'refresh_token': new_refresh_token, 'token_type': 'bearer'}
+
+
 @auth_router.post('/logout/')
-async def logout(refresh_token: str, db: Session = Depends(get_db)):
-    stored_token = db.query(RefreshToken).filter(RefreshToken.token == refresh_token).first()
-    if not stored_token:
+async def logout(refresh_token: str, db: AsyncSession = Depends(get_db)):
+    user_id = await consume_refresh_token(db, refresh_token)
+    if user_id is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Маалымат туура эмес")
-    db.delete(stored_token)
-    db.commit()
+    await db.commit()
     return {"message": "Сайттан чыктыныз"}
\ No newline at end of file
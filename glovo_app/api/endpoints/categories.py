@@ -1,56 +1,83 @@
-from fastapi import Depends, HTTPException, APIRouter
+from fastapi import Depends, HTTPException, APIRouter, Response, BackgroundTasks
+from fastapi.responses import JSONResponse
 from typing import List
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from glovo_app.db.models import Category
-from glovo_app.db.database import SessionLocal
+from glovo_app.db.models import Category, Store
+from glovo_app.db.database import get_db, AsyncSessionLocal
+from glovo_app.db.pagination import PageParams, page_params, paginate_by_id
+from glovo_app.db.purge import purge_category, cascaded_ids
 from glovo_app.db.schema import CategorySchema
+from glovo_app.cache import cached_page, invalidate, invalidate_deleted
+from glovo_app.config import CACHE_TTL_LIST
 
 
 category_router = APIRouter(prefix='/category', tags=['Category'])
 
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-
 #category
 @category_router.post('category/create/', response_model=CategorySchema)
-async def create_category(category: CategorySchema, db: Session = Depends(get_db)):
+async def create_category(category: CategorySchema, db: AsyncSession = Depends(get_db)):
     db_category = Category(category_name=category.category_name)
     db.add(db_category)
-    db.commit()
-    db.refresh(db_category)
+    await db.commit()
+    await db.refresh(db_category)
+    await invalidate('category')
     return db_category
 
 
 @category_router.get('/category/', response_model=List[CategorySchema])
-async def list_category(db: Session = Depends(get_db)):
-    return db.query(Category).all()
+async def list_category(response: Response, page: PageParams = Depends(page_params),
+                        db: AsyncSession = Depends(get_db)):
+    async def load_rows(page_response: Response):
+        return await paginate_by_id(db, select(Category), Category, page, page_response)
+
+    return await cached_page('category', (page.cursor, page.limit), CACHE_TTL_LIST, response, load_rows)
 
 
 @category_router.put('/category/{category_id', response_model=CategorySchema)
 async def update_category(category_id: int,
                           category_data: CategorySchema,
-                          db: Session = Depends(get_db)):
-    category = db.query(Category).filter(Category.id == category_id).first()
+                          db: AsyncSession = Depends(get_db)):
+    category = await db.scalar(select(Category).where(Category.id == category_id))
     if category is None:
         raise HTTPException(status_code=404, detail='Category not found')
     category.category_name = category_data.category_name
-    db.commit()
-    db.refresh(category)
+    await db.commit()
+    await db.refresh(category)
+    await invalidate('category')
     return category
 
 
+def category_store_ids(category_id: int):
+    return select(Store.id).where(Store.category_id == category_id)
+
+
+async def invalidate_category_deleted(deleted: dict):
+    await invalidate('category')
+    await invalidate_deleted(deleted)
+
+
+async def purge_category_in_background(category_id: int):
+    async with AsyncSessionLocal() as db:
+        deleted = await cascaded_ids(db, category_store_ids(category_id))
+    await purge_category(category_id)
+    await invalidate_category_deleted(deleted)
+
+
 @category_router.delete('/category/{category_id', response_model=CategorySchema)
-async def update_category(category_id: int, db: Session = Depends(get_db)):
-    category = db.query(Category).filter(Category.id == category_id).first()
+async def update_category(category_id: int, background_tasks: BackgroundTasks, background: bool = False,
+                          db: AsyncSession = Depends(get_db)):
+    category = await db.scalar(select(Category).where(Category.id == category_id))
     if category is None:
         raise HTTPException(status_code=404, detail='Category not found')
-    db.delete(category)
-    db.commit()
+    if background:
+        background_tasks.add_task(purge_category_in_background, category_id)
+        return JSONResponse(status_code=202, content={'message': 'category deletion scheduled'})
+    # магазины категории и все их дети удаляет ON DELETE CASCADE в базе одним запросом
+    deleted = await cascaded_ids(db, category_store_ids(category_id))
+    await db.delete(category)
+    await db.commit()
+    await invalidate_category_deleted(deleted)
     return category
\ No newline at end of file
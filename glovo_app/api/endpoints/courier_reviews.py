@@ -1,64 +1,107 @@
-from fastapi import Depends, HTTPException, APIRouter
-from typing import List
-from sqlalchemy.orm import Session
+from fastapi import Depends, HTTPException, APIRouter, Response
+from typing import List, Optional
+from sqlalchemy import null, select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from glovo_app.db.models import CourierReview
-from glovo_app.db.database import SessionLocal
-from glovo_app.db.schema import CourierReviewSchema
+from glovo_app.db.models import CourierReview, RatingStatus, CourierRating
+from glovo_app.db.ratings import apply_rating, move_rating
+from glovo_app.db.database import get_db, get_read_db
+from glovo_app.db.pagination import PageParams, page_params, paginate_rows_by_created
+from glovo_app.db.schema import CourierReviewSchema, RatingSummarySchema
+from glovo_app.idempotency import idempotency_key, idempotent
+from glovo_app.fast_json import projection
 
 
 courier_review_router = APIRouter(prefix='/courier_review', tags=['Courier_reviews'])
 
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+# поля схемы называются не так, как колонки модели; client_id в courier_review не хранится,
+# created_date ставит модель — это ключ партиций
+def courier_review_to_row(courier_review: CourierReviewSchema) -> dict:
+    return {
+        'courier_id': courier_review.courier_id,
+        'commend': courier_review.comment,
+        'rating': courier_review.rating,
+    }
+
+
+def courier_review_to_record(courier_review: CourierReview) -> dict:
+    return {
+        'courier_id': courier_review.courier_id,
+        'client_id': None,
+        'created_date': courier_review.created_date,
+        'comment': courier_review.commend,
+        'rating': courier_review.rating,
+    }
 
 
 # courier_review
 @courier_review_router.post('/courier_review/create/', response_model=CourierReviewSchema)
-async def courier_review_create(courier_review: CourierReviewSchema, db: Session = Depends(get_db)):
-    courier_review_db = CourierReview(**courier_review.dict())
-    db.add(courier_review_db)
-    db.commit()
-    db.refresh(courier_review_db)
-    return courier_review_db
+async def courier_review_create(courier_review: CourierReviewSchema, response: Response,
+                                key: Optional[str] = Depends(idempotency_key), db: AsyncSession = Depends(get_db)):
+    async def create():
+        courier_review_db = CourierReview(**courier_review_to_row(courier_review))
+        db.add(courier_review_db)
+        await apply_rating(db, CourierRating, CourierRating.courier_id, courier_review_db.courier_id,
+                           courier_review_db.rating, +1)
+        await db.commit()
+        await db.refresh(courier_review_db)
+        return courier_review_to_record(courier_review_db)
+
+    return await idempotent('courier_review', key, courier_review, response, create)
 
 
 @courier_review_router.get('/courier_review/', response_model=List[CourierReviewSchema])
-async def courier_review_list(db: Session = Depends(get_db)):
-    return db.query(CourierReview).all()
+async def courier_review_list(response: Response, rating: Optional[RatingStatus] = None,
+                              page: PageParams = Depends(page_params), db: AsyncSession = Depends(get_read_db)):
+    # id нужен только для курсора
+    query = select(*projection(CourierReviewSchema, CourierReview, comment=CourierReview.commend,
+                               client_id=null()), CourierReview.id)
+    if rating is not None:
+        query = query.where(CourierReview.rating == rating)
+    return await paginate_rows_by_created(db, query, CourierReview, page, response)
+
+
+@courier_review_router.get('/rating/{courier_id}/', response_model=RatingSummarySchema)
+async def courier_rating(courier_id: int, db: AsyncSession = Depends(get_read_db)):
+    aggregate = await db.get(CourierRating, courier_id)
+    if aggregate is None:
+        return RatingSummarySchema(review_count=0, avg_rating=None, histogram={str(star): 0 for star in range(1, 6)})
+    return RatingSummarySchema(review_count=aggregate.review_count, avg_rating=aggregate.avg_rating,
+                               histogram={str(star): getattr(aggregate, f'star_{star}') for star in range(1, 6)})
 
 
 @courier_review_router.get('/courier_review/{courier_review_id}/', response_model=CourierReviewSchema)
-async def courier_review_detail(courier_review_id: int, db: Session = Depends(get_db)):
-    courier_review = db.query(CourierReview).filter(CourierReview.id == courier_review_id).first()
+async def courier_review_detail(courier_review_id: int, db: AsyncSession = Depends(get_read_db)):
+    courier_review = await db.scalar(select(CourierReview).where(CourierReview.id == courier_review_id))
     if courier_review is None:
         raise HTTPException(status_code=404, detail='courier_review not found')
-    return courier_review
+    return courier_review_to_record(courier_review)
 
 
 @courier_review_router.put('/courier_review/{courier_review_id}/', response_model=CourierReviewSchema)
 async def courier_review_update(courier_review_id: int, courier_review_data: CourierReviewSchema,
-                                db: Session = Depends(get_db)):
-    courier_review = db.query(CourierReview).filter(CourierReview.id == courier_review_id).first()
+                                db: AsyncSession = Depends(get_db)):
+    courier_review = await db.scalar(select(CourierReview).where(CourierReview.id == courier_review_id))
     if courier_review is None:
         raise HTTPException(status_code=404, detail='courier_review not found')
-    for courier_review_key, courier_review_value in courier_review_data.dict().items():
+    old_courier_id, old_rating = courier_review.courier_id, courier_review.rating
+    values = courier_review_to_row(courier_review_data)
+    for courier_review_key, courier_review_value in values.items():
         setattr(courier_review, courier_review_key, courier_review_value)
-    db.commit()
-    db.refresh(courier_review)
-    return courier_review
+    await move_rating(db, CourierRating, CourierRating.courier_id, old_courier_id, old_rating,
+                      courier_review.courier_id, courier_review.rating)
+    await db.commit()
+    await db.refresh(courier_review)
+    return courier_review_to_record(courier_review)
 
 
 @courier_review_router.delete('/courier_review/{courier_review_id}/')
-async def courier_review_delete(courier_review_id: int, db: Session = Depends(get_db)):
-    courier_review = db.query(CourierReview).filter(CourierReview.id == courier_review_id).first()
+async def courier_review_delete(courier_review_id: int, db: AsyncSession = Depends(get_db)):
+    courier_review = await db.scalar(select(CourierReview).where(CourierReview.id == courier_review_id))
     if courier_review is None:
         raise HTTPException(status_code=404, detail='courier_review not found')
-    db.delete(courier_review)
-    db.commit()
+    await db.delete(courier_review)
+    await apply_rating(db, CourierRating, CourierRating.courier_id, courier_review.courier_id, courier_review.rating, -1)
+    await db.commit()
     return {'message': 'this courier_review is deleted'}
\ No newline at end of file
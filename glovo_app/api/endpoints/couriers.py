@@ -1,63 +1,71 @@
-from fastapi import Depends, HTTPException, APIRouter
-from typing import List
-from sqlalchemy.orm import Session
+from fastapi import Depends, HTTPException, APIRouter, Response
+from typing import List, Optional
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from glovo_app.db.models import Courier
-from glovo_app.db.database import SessionLocal
-from glovo_app.db.schema import CourierSchema
+from glovo_app.db.models import Courier, CourierStatus
+from glovo_app.db.database import get_db
+from glovo_app.db.pagination import PageParams, page_params, paginate_by_id
+from glovo_app.db.schema import CourierSchema, CourierLocationSchema
 
 
 courier_router = APIRouter(prefix='/courier', tags=['Couriers'])
 
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-
 # courier
 @courier_router.post('/courier/create/', response_model=CourierSchema)
-async def courier_create(courier: CourierSchema, db: Session = Depends(get_db)):
+async def courier_create(courier: CourierSchema, db: AsyncSession = Depends(get_db)):
     courier_db = Courier(**courier.dict())
     db.add(courier_db)
-    db.commit()
-    db.refresh(courier_db)
+    await db.commit()
+    await db.refresh(courier_db)
     return courier_db
 
 
 @courier_router.get('/courier/', response_model=List[CourierSchema])
-async def courier_list(db: Session = Depends(get_db)):
-    return db.query(Courier).all()
+async def courier_list(response: Response, status_courier: Optional[CourierStatus] = None,
+                       page: PageParams = Depends(page_params), db: AsyncSession = Depends(get_db)):
+    query = select(Courier)
+    if status_courier is not None:
+        query = query.where(Courier.status_courier == status_courier)
+    return await paginate_by_id(db, query, Courier, page, response)
 
 
 @courier_router.get('/courier/{courier_id}/', response_model=CourierSchema)
-async def courier_detail(courier_id: int, db: Session = Depends(get_db)):
-    courier = db.query(Courier).filter(Courier.id == courier_id).first()
+async def courier_detail(courier_id: int, db: AsyncSession = Depends(get_db)):
+    courier = await db.scalar(select(Courier).where(Courier.id == courier_id))
     if courier is None:
         raise HTTPException(status_code=404, detail='courier not found')
     return courier
 
 
 @courier_router.put('/courier/{courier_id}/', response_model=CourierSchema)
-async def courier_update(courier_id: int, courier_data: CourierSchema, db: Session = Depends(get_db)):
-    courier = db.query(Courier).filter(Courier.id == courier_id).first()
+async def courier_update(courier_id: int, courier_data: CourierSchema, db: AsyncSession = Depends(get_db)):
+    courier = await db.scalar(select(Courier).where(Courier.id == courier_id))
     if courier is None:
         raise HTTPException(status_code=404, detail='courier not found')
     for courier_key, courier_value in courier_data.dict().items():
         setattr(courier, courier_key, courier_value)
-    db.commit()
-    db.refresh(courier)
+    await db.commit()
+    await db.refresh(courier)
     return courier
 
 
+@courier_router.put('/courier/{courier_id}/location/')
+async def courier_location(courier_id: int, location: CourierLocationSchema, db: AsyncSession = Depends(get_db)):
+    result = await db.execute(update(Courier).where(Courier.id == courier_id)
+                              .values(latitude=location.latitude, longitude=location.longitude))
+    if result.rowcount == 0:
+        raise HTTPException(status_code=404, detail='courier not found')
+    await db.commit()
+    return {'message': 'location updated'}
+
+
 @courier_router.delete('/courier/{courier_id}/')
-async def courier_delete(courier_id: int, db: Session = Depends(get_db)):
-    courier = db.query(Courier).filter(Courier.id == courier_id).first()
+async def courier_delete(courier_id: int, db: AsyncSession = Depends(get_db)):
+    courier = await db.scalar(select(Courier).where(Courier.id == courier_id))
     if courier is None:
         raise HTTPException(status_code=404, detail='courier not found')
-    db.delete(courier)
-    db.commit()
+    await db.delete(courier)
+    await db.commit()
     return {'message': 'this courier is deleted'}
\ No newline at end of file
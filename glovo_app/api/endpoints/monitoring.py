@@ -0,0 +1,49 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from glovo_app.db.database import engine, async_engine, replica_engines, replica_router
+from glovo_app.db.pool_metrics import pool_stats
+from glovo_app import password_pool
+from glovo_app.token_cache import token_cache
+from glovo_app.order_events import order_status_hub
+from glovo_app.request_metrics import registry
+
+
+monitoring_router = APIRouter(prefix='/monitoring', tags=['Monitoring'])
+metrics_router = APIRouter(tags=['Monitoring'])
+
+
+@monitoring_router.get('/pool/')
+async def db_pool():
+    return {
+        'async': pool_stats(async_engine.pool),
+        'sync': pool_stats(engine.pool),
+        'replicas': [pool_stats(replica.pool) for replica in replica_engines],
+    }
+
+
+@monitoring_router.get('/replicas/')
+async def read_replicas():
+    if replica_router is None:
+        return {'failovers': 0, 'replicas': []}
+    return replica_router.stats()
+
+
+@monitoring_router.get('/password_hash/')
+async def password_hash_pool():
+    return password_pool.stats
+
+
+@monitoring_router.get('/auth_cache/')
+async def auth_cache():
+    return token_cache.stats()
+
+
+@monitoring_router.get('/order_events/')
+async def order_events():
+    return order_status_hub.stats()
+
+
+@metrics_router.get('/metrics', response_class=PlainTextResponse, include_in_schema=False)
+async def metrics():
+    return PlainTextResponse(registry.render(), media_type='text/plain; version=0.0.4')
@@ -1,63 +1,226 @@
-from fastapi import Depends, HTTPException, APIRouter
-from typing import List
-from sqlalchemy.orm import Session
+import asyncio
+import json
 
-from glovo_app.db.models import Order
-from glovo_app.db.database import SessionLocal
-from glovo_app.db.schema import OrderSchema
+from fastapi import Depends, HTTPException, APIRouter, Response, Request, WebSocket, Header
+from fastapi.responses import StreamingResponse
+from typing import List, Optional
+from sqlalchemy import select, delete
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import load_only
+from sqlalchemy.orm.exc import StaleDataError
+
+from glovo_app.db.models import Order, OrderStatus, OrderEvent
+from glovo_app.db.database import get_db, AsyncSessionLocal
+from glovo_app.db.pagination import PageParams, page_params, paginate_by_created
+from glovo_app.db.schema import (OrderSchema, OrderPatchSchema, OrderTransitionSchema, OrderBatchTransitionSchema,
+                                 OrderTransitionResultSchema, OrderEventSchema)
+from glovo_app.db.versioning import (set_etag, parse_if_match, check_version, version_conflict,
+                                     versioned_update)
+from glovo_app.db.order_states import apply_transitions, check_transition, event_row, release_couriers, FINAL_STATUSES
+from glovo_app.config import ORDER_TRANSITION_BATCH_MAX
+from glovo_app.idempotency import idempotency_key, idempotent
+from glovo_app.order_events import order_status_hub, publish_order_status
 
 
 order_router = APIRouter(prefix='/order', tags=['Orders'])
 
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+# в orders нет колонки client_id, id выдает sequence; created_date ставит модель (datetime.utcnow) —
+# это ключ месячных партиций, дата клиента могла не попасть ни в одну
+def order_to_row(order: OrderSchema) -> dict:
+    return {
+        'role': order.role,
+        'delivery_address': order.delivery_address,
+        'delivery_latitude': order.delivery_latitude,
+        'delivery_longitude': order.delivery_longitude,
+        'courier_id': order.courier_id,
+    }
 
 
 # order
 @order_router.post('/order/create/', response_model=OrderSchema)
-async def order_create(order: OrderSchema, db: Session = Depends(get_db)):
-    order_db = Order(**order.dict())
-    db.add(order_db)
-    db.commit()
-    db.refresh(order_db)
-    return order_db
+async def order_create(order: OrderSchema, response: Response,
+                       key: Optional[str] = Depends(idempotency_key), db: AsyncSession = Depends(get_db)):
+    async def create():
+        order_db = Order(**order_to_row(order))
+        db.add(order_db)
+        await db.flush()
+        db.add(OrderEvent(**event_row(order_db.id, None, order_db.role)))
+        await db.commit()
+        await db.refresh(order_db)
+        return order_db
+
+    return await idempotent('order', key, order, response, create)
 
 
 @order_router.get('/order/', response_model=List[OrderSchema])
-async def order_list(db: Session = Depends(get_db)):
-    return db.query(Order).all()
+async def order_list(response: Response, role: Optional[OrderStatus] = None,
+                     page: PageParams = Depends(page_params), db: AsyncSession = Depends(get_db)):
+    query = select(Order).options(load_only(Order.id, Order.role, Order.delivery_address, Order.created_date,
+                                            Order.courier_id, Order.delivery_latitude, Order.delivery_longitude))
+    if role is not None:
+        query = query.where(Order.role == role)
+    return await paginate_by_created(db, query, Order, page, response)
 
 
 @order_router.get('/order/{order_id}/', response_model=OrderSchema)
-async def order_detail(order_id: int, db: Session = Depends(get_db)):
-    order = db.query(Order).filter(Order.id == order_id).first()
+async def order_detail(order_id: int, response: Response, db: AsyncSession = Depends(get_db)):
+    order = await db.scalar(select(Order).where(Order.id == order_id))
     if order is None:
         raise HTTPException(status_code=404, detail='order not found')
+    set_etag(response, order.version)
     return order
 
 
 @order_router.put('/order/{order_id}/', response_model=OrderSchema)
-async def order_update(order_id: int, order_data: OrderSchema, db: Session = Depends(get_db)):
-    order = db.query(Order).filter(Order.id == order_id).first()
+async def order_update(order_id: int, order_data: OrderSchema, response: Response,
+                       if_match: Optional[str] = Header(None), db: AsyncSession = Depends(get_db)):
+    order = await db.scalar(select(Order).where(Order.id == order_id))
     if order is None:
         raise HTTPException(status_code=404, detail='order not found')
-    for order_key, order_value in order_data.dict().items():
+    check_version(order.version, parse_if_match(if_match))
+    old_role = order.role
+    values = order_to_row(order_data)
+    if values['role'] != old_role:
+        check_transition(order.id, old_role, values['role'])
+        db.add(OrderEvent(**event_row(order.id, old_role, values['role'])))
+        if values['role'] in FINAL_STATUSES:
+            await release_couriers(db, [order.courier_id])
+    for order_key, order_value in values.items():
         setattr(order, order_key, order_value)
-    db.commit()
-    db.refresh(order)
+    try:
+        await db.commit()
+    except StaleDataError:
+        raise version_conflict()
+    await db.refresh(order)
+    if order.role != old_role:
+        await publish_order_status(order.id, order.role)
+    set_etag(response, order.version)
     return order
 
 
+@order_router.patch('/order/{order_id}/', response_model=OrderSchema)
+async def order_patch(order_id: int, order_data: OrderPatchSchema, response: Response,
+                      if_match: Optional[str] = Header(None), db: AsyncSession = Depends(get_db)):
+    values = order_data.dict(exclude_unset=True)
+    if not values:
+        return await order_detail(order_id, response, db)
+    expected_version = parse_if_match(if_match)
+    role = values.pop('role', None)
+    if role is not None:
+        # смена статуса только по графу переходов и с записью события
+        await apply_transitions(db, [(order_id, role, None, expected_version)])
+        expected_version = None
+    if values:
+        order = await versioned_update(db, Order, order_id, values, expected_version)
+    else:
+        order = await db.scalar(select(Order).where(Order.id == order_id).execution_options(populate_existing=True))
+    if order is None:
+        raise HTTPException(status_code=404, detail='order not found')
+    await db.commit()
+    if role is not None:
+        await publish_order_status(order.id, order.role)
+    set_etag(response, order.version)
+    return order
+
+
+@order_router.post('/order/{order_id}/transition/', response_model=OrderSchema)
+async def order_transition(order_id: int, transition: OrderTransitionSchema, response: Response,
+                           if_match: Optional[str] = Header(None), db: AsyncSession = Depends(get_db)):
+    await apply_transitions(db, [(order_id, transition.role, transition.occurred_at, parse_if_match(if_match))])
+    await db.commit()
+    await publish_order_status(order_id, transition.role)
+    return await order_detail(order_id, response, db)
+
+
+@order_router.post('/transitions/', response_model=List[OrderTransitionResultSchema])
+async def order_transitions(transitions: List[OrderBatchTransitionSchema], db: AsyncSession = Depends(get_db)):
+    # весь батч в одной транзакции: один неверный переход — откатываются все
+    if len(transitions) > ORDER_TRANSITION_BATCH_MAX:
+        raise HTTPException(status_code=413, detail=f'at most {ORDER_TRANSITION_BATCH_MAX} transitions per batch')
+    if not transitions:
+        return []
+    results = await apply_transitions(db, [(item.order_id, item.role, item.occurred_at, item.version)
+                                           for item in transitions])
+    await db.commit()
+    for order_id, (role, _) in results.items():
+        await publish_order_status(order_id, role)
+    return [{'order_id': order_id, 'role': role, 'version': version}
+            for order_id, (role, version) in results.items()]
+
+
+@order_router.get('/order/{order_id}/history/', response_model=List[OrderEventSchema])
+async def order_history(order_id: int, db: AsyncSession = Depends(get_db)):
+    events = (await db.scalars(select(OrderEvent)
+                               .where(OrderEvent.order_id == order_id)
+                               .order_by(OrderEvent.created_date, OrderEvent.id))).all()
+    if not events and await db.scalar(select(Order.id).where(Order.id == order_id)) is None:
+        raise HTTPException(status_code=404, detail='order not found')
+    return events
+
+
 @order_router.delete('/order/{order_id}/')
-async def order_delete(order_id: int, db: Session = Depends(get_db)):
-    order = db.query(Order).filter(Order.id == order_id).first()
+async def order_delete(order_id: int, db: AsyncSession = Depends(get_db)):
+    order = await db.scalar(select(Order).where(Order.id == order_id))
     if order is None:
         raise HTTPException(status_code=404, detail='order not found')
-    db.delete(order)
-    db.commit()
-    return {'message': 'this order is deleted'}
\ No newline at end of file
+    await db.delete(order)
+    # у order_events нет FK на партиционированную orders, каскада нет
+    await db.execute(delete(OrderEvent).where(OrderEvent.order_id == order_id))
+    await db.commit()
+    return {'message': 'this order is deleted'}
+
+
+async def current_order_status(order_id: int):
+    # своя короткая сессия: соединение не должно висеть все время жизни подписки
+    async with AsyncSessionLocal() as db:
+        role = await db.scalar(select(Order.role).where(Order.id == order_id))
+    if role is None:
+        return None
+    return {'order_id': order_id, 'role': role.value}
+
+
+@order_router.websocket('/order/{order_id}/ws/')
+async def order_status_ws(websocket: WebSocket, order_id: int):
+    await websocket.accept()
+    async with order_status_hub.subscription(order_id) as queue:
+        initial = await current_order_status(order_id)
+        if initial is None:
+            await websocket.close(code=4404)
+            return
+        await websocket.send_json(initial)
+        receiver = asyncio.create_task(websocket.receive())
+        try:
+            while True:
+                getter = asyncio.create_task(queue.get())
+                done, _ = await asyncio.wait({getter, receiver}, return_when=asyncio.FIRST_COMPLETED)
+                if receiver in done:
+                    getter.cancel()
+                    if receiver.result()['type'] == 'websocket.disconnect':
+                        return
+                    receiver = asyncio.create_task(websocket.receive())
+                    continue
+                await websocket.send_json(getter.result())
+        finally:
+            receiver.cancel()
+
+
+@order_router.get('/order/{order_id}/events/')
+async def order_status_events(order_id: int, request: Request):
+    initial = await current_order_status(order_id)
+    if initial is None:
+        raise HTTPException(status_code=404, detail='order not found')
+
+    async def stream():
+        async with order_status_hub.subscription(order_id) as queue:
+            yield f'data: {json.dumps(initial, ensure_ascii=False)}\n\n'
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=15)
+                except asyncio.TimeoutError:
+                    # keep-alive, чтобы прокси не закрыл соединение
+                    yield ': ping\n\n'
+                    continue
+                yield f'data: {json.dumps(event, ensure_ascii=False)}\n\n'
+
+    return StreamingResponse(stream(), media_type='text/event-stream', headers={'Cache-Control': 'no-cache'})
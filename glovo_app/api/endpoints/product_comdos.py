@@ -1,63 +1,145 @@
-from fastapi import Depends, HTTPException, APIRouter
-from typing import List
-from sqlalchemy.orm import Session
+from fastapi import Depends, HTTPException, APIRouter, Response, Request, Query
+from fastapi.responses import StreamingResponse
+from typing import List, Optional, Literal
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from glovo_app.db.models import ProductCombo
-from glovo_app.db.database import SessionLocal
-from glovo_app.db.schema import ProductComboSchema
+from glovo_app.db.database import get_db
+from glovo_app.db.bulk import upsert_rows, import_stream, export_stream, NDJSON, CSV
+from glovo_app.db.pagination import PageParams, page_params, paginate_rows_by_id
+from glovo_app.db.schema import ProductComboSchema, ProductComboListSchema
+from glovo_app.cache import cached_detail, cached_page, invalidate, invalidate_many, row_to_dict
+from glovo_app.config import CACHE_TTL_DETAIL, CACHE_TTL_LIST
+from glovo_app.fast_json import FastJSONResponse, projection, fast_list_response, list_responses
 
 
 product_combo_router = APIRouter(prefix='/product_combo', tags=['Product_combos'])
 
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+# поля схемы называются не так, как колонки модели
+def product_combo_to_row(product_combo: ProductComboSchema) -> dict:
+    return {
+        'id': product_combo.id,
+        'combo_name': product_combo.product_name,
+        'description': product_combo.description,
+        'price': product_combo.price,
+        'combo_image': product_combo.image,
+        'store_id': product_combo.store_id,
+    }
+
+
+def product_combo_to_record(product_combo: dict) -> dict:
+    # product_combo — строка из кеша (row_to_dict), так detail, запись и export отдают одно и то же
+    return {
+        'id': product_combo['id'],
+        'product_name': product_combo['combo_name'],
+        'description': product_combo['description'],
+        'price': product_combo['price'],
+        'image': product_combo['combo_image'],
+        'store_id': product_combo['store_id'],
+    }
+
+
+async def invalidate_bulk(ids, store_ids):
+    await invalidate_many('product_combo', ids)
+    for store_id in store_ids:
+        await invalidate('menu', store_id)
 
 
 # product_combo
 @product_combo_router.post('/product_combo/create/', response_model=ProductComboSchema)
-async def product_combo_create(product_combo: ProductComboSchema, db: Session = Depends(get_db)):
-    product_combo_db = ProductCombo(**product_combo.dict())
+async def product_combo_create(product_combo: ProductComboSchema, db: AsyncSession = Depends(get_db)):
+    # id выдает sequence; свой id задают только bulk и import
+    values = product_combo_to_row(product_combo)
+    del values['id']
+    product_combo_db = ProductCombo(**values)
     db.add(product_combo_db)
-    db.commit()
-    db.refresh(product_combo_db)
-    return product_combo_db
+    await db.commit()
+    await db.refresh(product_combo_db)
+    await invalidate('product_combo', product_combo_db.id)
+    await invalidate('menu', product_combo_db.store_id)
+    return product_combo_to_record(row_to_dict(product_combo_db))
+
+
+@product_combo_router.post('/product_combo/bulk/')
+async def product_combo_bulk_upsert(product_combos: List[ProductComboSchema], db: AsyncSession = Depends(get_db)):
+    rows = [product_combo_to_row(product_combo) for product_combo in product_combos]
+    if rows:
+        await upsert_rows(db, ProductCombo, rows)
+        await db.commit()
+    await invalidate_bulk([row['id'] for row in rows], {row['store_id'] for row in rows})
+    return {'count': len(rows)}
+
+
+@product_combo_router.post('/product_combo/import/')
+async def product_combo_import(request: Request, db: AsyncSession = Depends(get_db)):
+    # тело читается потоком (NDJSON или CSV), в памяти только текущий батч
+    content_type = request.headers.get('content-type', NDJSON)
+    ids, store_ids = await import_stream(db, ProductCombo, ProductComboSchema, product_combo_to_row,
+                                         request.stream(), content_type)
+    await db.commit()
+    await invalidate_bulk(ids, store_ids)
+    return {'count': len(ids)}
+
+
+@product_combo_router.get('/product_combo/export/')
+async def product_combo_export(file_format: Literal['ndjson', 'csv'] = Query('ndjson', alias='format')):
+    media_type = CSV if file_format == 'csv' else NDJSON
+    return StreamingResponse(export_stream(ProductCombo, product_combo_to_record, file_format), media_type=media_type)
+
 
+@product_combo_router.get('/product_combo/', response_class=FastJSONResponse,
+                          responses=list_responses(ProductComboListSchema))
+async def product_combo_list(response: Response, store_id: Optional[int] = None,
+                             page: PageParams = Depends(page_params), db: AsyncSession = Depends(get_db)):
+    async def load_rows(page_response: Response):
+        query = select(*projection(ProductComboListSchema, ProductCombo, product_name=ProductCombo.combo_name,
+                                   image=ProductCombo.combo_image))
+        if store_id is not None:
+            query = query.where(ProductCombo.store_id == store_id)
+        return await paginate_rows_by_id(db, query, ProductCombo, page, page_response)
 
-@product_combo_router.get('/product_combo/', response_model=List[ProductComboSchema])
-async def product_combo_list(db: Session = Depends(get_db)):
-    return db.query(ProductCombo).all()
+    rows = await cached_page('product_combo', (store_id, page.cursor, page.limit), CACHE_TTL_LIST, response,
+                             load_rows)
+    return fast_list_response(ProductComboListSchema, rows, response)
 
 
 @product_combo_router.get('/product_combo/{product_combo_id}/', response_model=ProductComboSchema)
-async def product_combo_detail(product_combo_id: int, db: Session = Depends(get_db)):
-    product_combo = db.query(ProductCombo).filter(ProductCombo.id == product_combo_id).first()
+async def product_combo_detail(product_combo_id: int, db: AsyncSession = Depends(get_db)):
+    product_combo = await cached_detail('product_combo', product_combo_id, CACHE_TTL_DETAIL,
+                                        lambda: db.scalar(select(ProductCombo).where(ProductCombo.id == product_combo_id)))
     if product_combo is None:
         raise HTTPException(status_code=404, detail='product_combo not found')
-    return product_combo
+    return product_combo_to_record(product_combo)
 
 
 @product_combo_router.put('/product_combo/{product_combo_id}/', response_model=ProductComboSchema)
-async def product_combo_update(product_combo_id: int, product_combo_data: ProductComboSchema, db: Session = Depends(get_db)):
-    product_combo = db.query(ProductCombo).filter(ProductCombo.id == product_combo_id).first()
+async def product_combo_update(product_combo_id: int, product_combo_data: ProductComboSchema, db: AsyncSession = Depends(get_db)):
+    product_combo = await db.scalar(select(ProductCombo).where(ProductCombo.id == product_combo_id))
     if product_combo is None:
         raise HTTPException(status_code=404, detail='product_combo not found')
-    for product_combo_key, product_combo_value in product_combo_data.dict().items():
+    old_store_id = product_combo.store_id
+    values = product_combo_to_row(product_combo_data)
+    del values['id']
+    for product_combo_key, product_combo_value in values.items():
         setattr(product_combo, product_combo_key, product_combo_value)
-    db.commit()
-    db.refresh(product_combo)
-    return product_combo
+    await db.commit()
+    await db.refresh(product_combo)
+    await invalidate('product_combo', product_combo_id)
+    await invalidate('menu', old_store_id)
+    if product_combo.store_id != old_store_id:
+        await invalidate('menu', product_combo.store_id)
+    return product_combo_to_record(row_to_dict(product_combo))
 
 
 @product_combo_router.delete('/product_combo/{product_combo_id}/')
-async def product_combo_delete(product_combo_id: int, db: Session = Depends(get_db)):
-    product_combo = db.query(ProductCombo).filter(ProductCombo.id == product_combo_id).first()
+async def product_combo_delete(product_combo_id: int, db: AsyncSession = Depends(get_db)):
+    product_combo = await db.scalar(select(ProductCombo).where(ProductCombo.id == product_combo_id))
     if product_combo is None:
         raise HTTPException(status_code=404, detail='product_combo not found')
-    db.delete(product_combo)
-    db.commit()
+    await db.delete(product_combo)
+    await db.commit()
+    await invalidate('menu', product_combo.store_id)
+    await invalidate('product_combo', product_combo_id)
     return {'message': 'this product_combo is deleted'}
\ No newline at end of file
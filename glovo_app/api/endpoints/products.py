@@ -1,63 +1,142 @@
-from fastapi import Depends, HTTPException, APIRouter
-from typing import List
-from sqlalchemy.orm import Session
+from fastapi import Depends, HTTPException, APIRouter, Response, Request, Query
+from fastapi.responses import StreamingResponse
+from typing import List, Optional, Literal
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from glovo_app.db.models import Product
-from glovo_app.db.database import SessionLocal
-from glovo_app.db.schema import ProductSchema
+from glovo_app.db.database import get_db
+from glovo_app.db.bulk import upsert_rows, import_stream, export_stream, NDJSON, CSV
+from glovo_app.db.pagination import PageParams, page_params, paginate_rows_by_id
+from glovo_app.db.schema import ProductSchema, ProductListSchema
+from glovo_app.cache import cached_detail, cached_page, invalidate, invalidate_many, row_to_dict
+from glovo_app.config import CACHE_TTL_DETAIL, CACHE_TTL_LIST
+from glovo_app.fast_json import FastJSONResponse, projection, fast_list_response, list_responses
 
 
 product_router = APIRouter(prefix='/product', tags=['Products'])
 
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+# поля схемы называются не так, как колонки модели
+def product_to_row(product: ProductSchema) -> dict:
+    return {
+        'id': product.id,
+        'product_name': product.product_name,
+        'description': product.product_description,
+        'price': product.price,
+        'product_image': product.product_image,
+        'store_id': product.store_id,
+    }
+
+
+def product_to_record(product: dict) -> dict:
+    # product — строка из кеша (row_to_dict), так detail, запись и export отдают одно и то же
+    return {
+        'id': product['id'],
+        'product_name': product['product_name'],
+        'product_description': product['description'],
+        'price': product['price'],
+        'product_image': product['product_image'],
+        'store_id': product['store_id'],
+    }
+
+
+async def invalidate_bulk(ids, store_ids):
+    await invalidate_many('product', ids)
+    for store_id in store_ids:
+        await invalidate('menu', store_id)
 
 
 # product
 @product_router.post('/product/create/', response_model=ProductSchema)
-async def product_create(product: ProductSchema, db: Session = Depends(get_db)):
-    product_db = Product(**product.dict())
+async def product_create(product: ProductSchema, db: AsyncSession = Depends(get_db)):
+    # id выдает sequence; свой id задают только bulk и import
+    values = product_to_row(product)
+    del values['id']
+    product_db = Product(**values)
     db.add(product_db)
-    db.commit()
-    db.refresh(product_db)
-    return product_db
+    await db.commit()
+    await db.refresh(product_db)
+    await invalidate('product', product_db.id)
+    await invalidate('menu', product_db.store_id)
+    return product_to_record(row_to_dict(product_db))
+
+
+@product_router.post('/product/bulk/')
+async def product_bulk_upsert(products: List[ProductSchema], db: AsyncSession = Depends(get_db)):
+    rows = [product_to_row(product) for product in products]
+    if rows:
+        await upsert_rows(db, Product, rows)
+        await db.commit()
+    await invalidate_bulk([row['id'] for row in rows], {row['store_id'] for row in rows})
+    return {'count': len(rows)}
+
+
+@product_router.post('/product/import/')
+async def product_import(request: Request, db: AsyncSession = Depends(get_db)):
+    # тело читается потоком (NDJSON или CSV), в памяти только текущий батч
+    content_type = request.headers.get('content-type', NDJSON)
+    ids, store_ids = await import_stream(db, Product, ProductSchema, product_to_row,
+                                         request.stream(), content_type)
+    await db.commit()
+    await invalidate_bulk(ids, store_ids)
+    return {'count': len(ids)}
+
+
+@product_router.get('/product/export/')
+async def product_export(file_format: Literal['ndjson', 'csv'] = Query('ndjson', alias='format')):
+    media_type = CSV if file_format == 'csv' else NDJSON
+    return StreamingResponse(export_stream(Product, product_to_record, file_format), media_type=media_type)
+
 
+@product_router.get('/product/', response_class=FastJSONResponse, responses=list_responses(ProductListSchema))
+async def product_list(response: Response, store_id: Optional[int] = None,
+                       page: PageParams = Depends(page_params), db: AsyncSession = Depends(get_db)):
+    async def load_rows(page_response: Response):
+        query = select(*projection(ProductListSchema, Product))
+        if store_id is not None:
+            query = query.where(Product.store_id == store_id)
+        return await paginate_rows_by_id(db, query, Product, page, page_response)
 
-@product_router.get('/product/', response_model=List[ProductSchema])
-async def product_list(db: Session = Depends(get_db)):
-    return db.query(Product).all()
+    rows = await cached_page('product', (store_id, page.cursor, page.limit), CACHE_TTL_LIST, response, load_rows)
+    return fast_list_response(ProductListSchema, rows, response)
 
 
 @product_router.get('/product/{product_id}/', response_model=ProductSchema)
-async def product_detail(product_id: int, db: Session = Depends(get_db)):
-    product = db.query(Product).filter(Product.id == product_id).first()
+async def product_detail(product_id: int, db: AsyncSession = Depends(get_db)):
+    product = await cached_detail('product', product_id, CACHE_TTL_DETAIL,
+                                  lambda: db.scalar(select(Product).where(Product.id == product_id)))
     if product is None:
         raise HTTPException(status_code=404, detail='product not found')
-    return product
+    return product_to_record(product)
 
 
 @product_router.put('/product/{product_id}/', response_model=ProductSchema)
-async def product_update(product_id: int, product_data: ProductSchema, db: Session = Depends(get_db)):
-    product = db.query(Product).filter(Product.id == product_id).first()
+async def product_update(product_id: int, product_data: ProductSchema, db: AsyncSession = Depends(get_db)):
+    product = await db.scalar(select(Product).where(Product.id == product_id))
     if product is None:
         raise HTTPException(status_code=404, detail='product not found')
-    for product_key, product_value in product_data.dict().items():
+    old_store_id = product.store_id
+    values = product_to_row(product_data)
+    del values['id']
+    for product_key, product_value in values.items():
         setattr(product, product_key, product_value)
-    db.commit()
-    db.refresh(product)
-    return product
+    await db.commit()
+    await db.refresh(product)
+    await invalidate('product', product_id)
+    await invalidate('menu', old_store_id)
+    if product.store_id != old_store_id:
+        await invalidate('menu', product.store_id)
+    return product_to_record(row_to_dict(product))
 
 
 @product_router.delete('/product/{product_id}/')
-async def product_delete(product_id: int, db: Session = Depends(get_db)):
-    product = db.query(Product).filter(Product.id == product_id).first()
+async def product_delete(product_id: int, db: AsyncSession = Depends(get_db)):
+    product = await db.scalar(select(Product).where(Product.id == product_id))
     if product is None:
         raise HTTPException(status_code=404, detail='product not found')
-    db.delete(product)
-    db.commit()
+    await db.delete(product)
+    await db.commit()
+    await invalidate('menu', product.store_id)
+    await invalidate('product', product_id)
     return {'message': 'this product is deleted'}
\ No newline at end of file
@@ -0,0 +1,23 @@
+from fastapi import Depends, HTTPException, APIRouter, Query
+from typing import List, Literal
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from glovo_app.config import PAGE_SIZE_DEFAULT, PAGE_SIZE_MAX, SEARCH_MAX_OFFSET
+from glovo_app.db.database import get_db
+from glovo_app.db.schema import SearchResultSchema
+from glovo_app.db.search import search_query, prefix_tsquery
+
+
+search_router = APIRouter(prefix='/search', tags=['Search'])
+
+
+@search_router.get('/', response_model=List[SearchResultSchema])
+async def search(q: str = Query(..., min_length=2, max_length=100),
+                 kind: List[Literal['store', 'product', 'combo']] = Query(['store', 'product', 'combo']),
+                 limit: int = Query(PAGE_SIZE_DEFAULT, ge=1, le=PAGE_SIZE_MAX),
+                 offset: int = Query(0, ge=0, le=SEARCH_MAX_OFFSET),
+                 db: AsyncSession = Depends(get_db)):
+    if not prefix_tsquery(q):
+        raise HTTPException(status_code=400, detail='empty search query')
+    result = await db.execute(search_query(q, list(dict.fromkeys(kind)), limit, offset))
+    return result.mappings().all()
@@ -1,5 +1,3 @@
-from sqlalchemy.orm import Session
-from glovo_app.db.database import SessionLocal
 from fastapi import APIRouter
 from starlette.requests import Request
 from glovo_app.config import settings
@@ -17,14 +15,6 @@ oauth.register(
 )
 
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-
 @social_router.get('/github/')
 async def github_login(request: Request):
     redirect_uri = settings.GITHUB_URL
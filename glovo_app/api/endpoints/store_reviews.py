@@ -1,63 +1,113 @@
-from fastapi import Depends, HTTPException, APIRouter
-from typing import List
-from sqlalchemy.orm import Session
+from fastapi import Depends, HTTPException, APIRouter, Response
+from typing import List, Optional
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from glovo_app.db.models import StoreReview
-from glovo_app.db.database import SessionLocal
-from glovo_app.db.schema import StoreReviewSchema
+from glovo_app.db.models import StoreReview, RatingStatus, StoreRating
+from glovo_app.db.ratings import apply_rating, move_rating
+from glovo_app.db.database import get_db, get_read_db
+from glovo_app.db.pagination import PageParams, page_params, paginate_rows_by_created
+from glovo_app.db.schema import StoreReviewSchema, RatingSummarySchema
+from glovo_app.cache import invalidate
+from glovo_app.idempotency import idempotency_key, idempotent
+from glovo_app.fast_json import projection
 
 
 store_review_router = APIRouter(prefix='/store_review', tags=['Store_reviews'])
 
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+# поля схемы называются не так, как колонки модели; created_date ставит модель — это ключ партиций
+def store_review_to_row(store_review: StoreReviewSchema) -> dict:
+    return {
+        'store_id': store_review.store_id,
+        'client_id': store_review.client_id,
+        'commend': store_review.comment,
+        'rating': store_review.rating,
+    }
+
+
+def store_review_to_record(store_review: StoreReview) -> dict:
+    return {
+        'store_id': store_review.store_id,
+        'client_id': store_review.client_id,
+        'created_date': store_review.created_date,
+        'comment': store_review.commend,
+        'rating': store_review.rating,
+    }
 
 
 # store_review
 @store_review_router.post('/store_review/create/', response_model=StoreReviewSchema)
-async def store_review_create(store_review: StoreReviewSchema, db: Session = Depends(get_db)):
-    store_review_db = StoreReview(**store_review.dict())
-    db.add(store_review_db)
-    db.commit()
-    db.refresh(store_review_db)
-    return store_review_db
+async def store_review_create(store_review: StoreReviewSchema, response: Response,
+                              key: Optional[str] = Depends(idempotency_key), db: AsyncSession = Depends(get_db)):
+    async def create():
+        store_review_db = StoreReview(**store_review_to_row(store_review))
+        db.add(store_review_db)
+        await apply_rating(db, StoreRating, StoreRating.store_id, store_review_db.store_id, store_review_db.rating, +1)
+        await db.commit()
+        await db.refresh(store_review_db)
+        await invalidate('menu', store_review_db.store_id)
+        return store_review_to_record(store_review_db)
+
+    return await idempotent('store_review', key, store_review, response, create)
 
 
 @store_review_router.get('/store_review/', response_model=List[StoreReviewSchema])
-async def store_review_list(db: Session = Depends(get_db)):
-    return db.query(StoreReview).all()
+async def store_review_list(response: Response, store_id: Optional[int] = None,
+                            rating: Optional[RatingStatus] = None,
+                            page: PageParams = Depends(page_params), db: AsyncSession = Depends(get_read_db)):
+    # id нужен только для курсора
+    query = select(*projection(StoreReviewSchema, StoreReview, comment=StoreReview.commend), StoreReview.id)
+    if store_id is not None:
+        query = query.where(StoreReview.store_id == store_id)
+    if rating is not None:
+        query = query.where(StoreReview.rating == rating)
+    return await paginate_rows_by_created(db, query, StoreReview, page, response)
+
+
+@store_review_router.get('/rating/{store_id}/', response_model=RatingSummarySchema)
+async def store_rating(store_id: int, db: AsyncSession = Depends(get_read_db)):
+    aggregate = await db.get(StoreRating, store_id)
+    if aggregate is None:
+        return RatingSummarySchema(review_count=0, avg_rating=None, histogram={str(star): 0 for star in range(1, 6)})
+    return RatingSummarySchema(review_count=aggregate.review_count, avg_rating=aggregate.avg_rating,
+                               histogram={str(star): getattr(aggregate, f'star_{star}') for star in range(1, 6)})
 
 
 @store_review_router.get('/store_review/{store_review_id}/', response_model=StoreReviewSchema)
-async def store_review_detail(store_review_id: int, db: Session = Depends(get_db)):
-    store_review = db.query(StoreReview).filter(StoreReview.id == store_review_id).first()
+async def store_review_detail(store_review_id: int, db: AsyncSession = Depends(get_read_db)):
+    store_review = await db.scalar(select(StoreReview).where(StoreReview.id == store_review_id))
     if store_review is None:
         raise HTTPException(status_code=404, detail='store_review not found')
-    return store_review
+    return store_review_to_record(store_review)
 
 
 @store_review_router.put('/store_review/{store_review_id}/', response_model=StoreReviewSchema)
-async def store_review_update(store_review_id: int, store_review_data: StoreReviewSchema, db: Session = Depends(get_db)):
-    store_review = db.query(StoreReview).filter(StoreReview.id == store_review_id).first()
+async def store_review_update(store_review_id: int, store_review_data: StoreReviewSchema, db: AsyncSession = Depends(get_db)):
+    store_review = await db.scalar(select(StoreReview).where(StoreReview.id == store_review_id))
     if store_review is None:
         raise HTTPException(status_code=404, detail='store_review not found')
-    for store_review_key, store_review_value in store_review_data.dict().items():
+    old_store_id, old_rating = store_review.store_id, store_review.rating
+    values = store_review_to_row(store_review_data)
+    for store_review_key, store_review_value in values.items():
         setattr(store_review, store_review_key, store_review_value)
-    db.commit()
-    db.refresh(store_review)
-    return store_review
+    await move_rating(db, StoreRating, StoreRating.store_id, old_store_id, old_rating,
+                      store_review.store_id, store_review.rating)
+    await db.commit()
+    await db.refresh(store_review)
+    await invalidate('menu', old_store_id)
+    if store_review.store_id != old_store_id:
+        await invalidate('menu', store_review.store_id)
+    return store_review_to_record(store_review)
 
 
 @store_review_router.delete('/store_review/{store_review_id}/')
-async def store_review_delete(store_review_id: int, db: Session = Depends(get_db)):
-    store_review = db.query(StoreReview).filter(StoreReview.id == store_review_id).first()
+async def store_review_delete(store_review_id: int, db: AsyncSession = Depends(get_db)):
+    store_review = await db.scalar(select(StoreReview).where(StoreReview.id == store_review_id))
     if store_review is None:
         raise HTTPException(status_code=404, detail='store_review not found')
-    db.delete(store_review)
-    db.commit()
+    await db.delete(store_review)
+    await apply_rating(db, StoreRating, StoreRating.store_id, store_review.store_id, store_review.rating, -1)
+    await db.commit()
+    await invalidate('menu', store_review.store_id)
     return {'message': 'this store_review is deleted'}
\ No newline at end of file
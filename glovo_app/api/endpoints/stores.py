@@ -1,63 +1,212 @@
-from fastapi import Depends, HTTPException, APIRouter
-from typing import List
-from sqlalchemy.orm import Session
+from fastapi import Depends, HTTPException, APIRouter, Response, Query, Header, BackgroundTasks
+from fastapi.responses import JSONResponse
+from typing import List, Optional
+from sqlalchemy import Float, func, select
+from sqlalchemy.orm import joinedload, selectinload
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm.exc import StaleDataError
 
-from glovo_app.db.models import Store
-from glovo_app.db.database import SessionLocal
-from glovo_app.db.schema import StoreSchema
+from glovo_app.db.models import Store, StoreRating
+from glovo_app.db.database import get_db, get_read_db, AsyncSessionLocal
+from glovo_app.db.pagination import PageParams, page_params, paginate_rows_by_id
+from glovo_app.db.schema import (StoreSchema, StoreListSchema, StorePatchSchema, StoreMenuSchema,
+                                  NearbyStoreSchema)
+from glovo_app.db.versioning import (set_etag, parse_if_match, check_version, version_conflict,
+                                     versioned_update)
+from glovo_app.db.geo import distance_km, planar_origin, planar_point, planar_radius
+from glovo_app.db.purge import purge_store, cascaded_ids
+from glovo_app.cache import cached_detail, cached_object, cached_page, invalidate, invalidate_deleted, row_to_dict
+from glovo_app.config import CACHE_TTL_DETAIL, CACHE_TTL_LIST, PAGE_SIZE_MAX, MAX_DELIVERY_RADIUS_KM
+from glovo_app.fast_json import FastJSONResponse, projection, fast_list_response, list_responses
 
 
 stores_router = APIRouter(prefix='/store', tags=['Stores'])
 
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+# поля схемы называются не так, как колонки модели
+def store_to_row(store: StoreSchema) -> dict:
+    return {
+        'store_name': store.store_name,
+        'description': store.store_description,
+        'address': store.address,
+        'store_image': store.store_image,
+        'user_id': store.owner_id,
+        'category_id': store.category_id,
+        'latitude': store.latitude,
+        'longitude': store.longitude,
+    }
+
+
+def store_to_record(store: dict) -> dict:
+    # store — строка из кеша (row_to_dict), так detail и запись отдают одно и то же
+    return {
+        'id': store['id'],
+        'store_name': store['store_name'],
+        'store_description': store['description'],
+        'address': store['address'],
+        'store_image': store['store_image'],
+        'owner_id': store['user_id'],
+        'category_id': store['category_id'],
+        'latitude': store['latitude'],
+        'longitude': store['longitude'],
+    }
 
 
 # store
 @stores_router.post('/store/create/', response_model=StoreSchema)
-async def store_create(store: StoreSchema, db: Session = Depends(get_db)):
-    store_db = Store(**store.dict())
+async def store_create(store: StoreSchema, db: AsyncSession = Depends(get_db)):
+    store_db = Store(**store_to_row(store))
     db.add(store_db)
-    db.commit()
-    db.refresh(store_db)
-    return store_db
+    await db.commit()
+    await db.refresh(store_db)
+    await invalidate('store', store_db.id)
+    return store_to_record(row_to_dict(store_db))
 
 
-@stores_router.get('/store/', response_model=List[StoreSchema])
-async def store_list(db: Session = Depends(get_db)):
-    return db.query(Store).all()
+@stores_router.get('/store/', response_class=FastJSONResponse, responses=list_responses(StoreListSchema))
+async def store_list(response: Response, category_id: Optional[int] = None, user_id: Optional[int] = None,
+                     page: PageParams = Depends(page_params), db: AsyncSession = Depends(get_db)):
+    async def load_rows(page_response: Response):
+        query = select(*projection(StoreListSchema, Store, owner_id=Store.user_id))
+        if category_id is not None:
+            query = query.where(Store.category_id == category_id)
+        if user_id is not None:
+            query = query.where(Store.user_id == user_id)
+        return await paginate_rows_by_id(db, query, Store, page, page_response)
+
+    rows = await cached_page('store', (category_id, user_id, page.cursor, page.limit), CACHE_TTL_LIST,
+                             response, load_rows)
+    return fast_list_response(StoreListSchema, rows, response)
 
 
 @stores_router.get('/store/{store_id}/', response_model=StoreSchema)
-async def store_detail(store_id: int, db: Session = Depends(get_db)):
-    store = db.query(Store).filter(Store.id == store_id).first()
+async def store_detail(store_id: int, response: Response, db: AsyncSession = Depends(get_db)):
+    store = await cached_detail('store', store_id, CACHE_TTL_DETAIL,
+                                lambda: db.scalar(select(Store).where(Store.id == store_id)))
     if store is None:
         raise HTTPException(status_code=404, detail='store not found')
-    return store
+    set_etag(response, store['version'])
+    return store_to_record(store)
+
+
+def nearby_query(latitude: float, longitude: float, k: int, category_id: Optional[int] = None):
+    # KNN по ix_store_location_knn: индекс отдает магазины от ближнего к дальнему внутри круга
+    # максимального радиуса, открытость и радиус доставки проверяются на лету, пока не наберется k
+    location = planar_point(Store.latitude, Store.longitude)
+    origin = planar_origin(latitude, longitude)
+    within = location.op('<@', is_comparison=True)(func.circle(origin, planar_radius(MAX_DELIVERY_RADIUS_KM)))
+    distance = distance_km(Store.latitude, Store.longitude, latitude, longitude).label('distance_km')
+    query = (select(Store.id, Store.store_name, Store.store_image, Store.address, Store.category_id,
+                    Store.latitude, Store.longitude, distance)
+             .where(within,
+                    Store.is_open.is_(True),
+                    distance <= Store.delivery_radius_km)
+             .order_by(location.op('<->', return_type=Float)(origin))
+             .limit(k))
+    if category_id is not None:
+        query = query.where(Store.category_id == category_id)
+    return query
+
+
+@stores_router.get('/nearby/', response_model=List[NearbyStoreSchema])
+async def store_nearby(latitude: float = Query(..., ge=-90, le=90), longitude: float = Query(..., ge=-180, le=180),
+                       category_id: Optional[int] = None, k: int = Query(20, ge=1, le=PAGE_SIZE_MAX),
+                       db: AsyncSession = Depends(get_read_db)):
+    rows = (await db.execute(nearby_query(latitude, longitude, k, category_id))).mappings().all()
+    # порядок индекса — по планарной проекции, итог сортируем по точному haversine
+    return sorted(rows, key=lambda row: row['distance_km'])
+
+
+async def load_store_menu(db: AsyncSession, store_id: int):
+    # store + contacts + готовый агрегат рейтинга одним join, products и combos двумя selectin запросами
+    query = (select(Store, StoreRating)
+             .outerjoin(StoreRating, StoreRating.store_id == Store.id)
+             .where(Store.id == store_id)
+             .options(joinedload(Store.contact_store),
+                      selectinload(Store.product),
+                      selectinload(Store.product_combo)))
+    row = (await db.execute(query)).unique().first()
+    if row is None:
+        return None
+    store, rating = row
+    menu = row_to_dict(store)
+    menu['avg_rating'] = rating.avg_rating if rating is not None else None
+    menu['review_count'] = rating.review_count if rating is not None else 0
+    menu['contacts'] = [row_to_dict(contact) for contact in store.contact_store]
+    menu['products'] = [row_to_dict(product) for product in store.product]
+    menu['combos'] = [row_to_dict(combo) for combo in store.product_combo]
+    return menu
+
+
+@stores_router.get('/{store_id}/menu/', response_model=StoreMenuSchema)
+async def store_menu(store_id: int, db: AsyncSession = Depends(get_db)):
+    menu = await cached_object('menu', store_id, CACHE_TTL_DETAIL, lambda: load_store_menu(db, store_id))
+    if menu is None:
+        raise HTTPException(status_code=404, detail='store not found')
+    return menu
 
 
 @stores_router.put('/store/{store_id}/', response_model=StoreSchema)
-async def store_update(store_id: int, store_data: StoreSchema, db: Session = Depends(get_db)):
-    store = db.query(Store).filter(Store.id == store_id).first()
+async def store_update(store_id: int, store_data: StoreSchema, response: Response,
+                       if_match: Optional[str] = Header(None), db: AsyncSession = Depends(get_db)):
+    store = await db.scalar(select(Store).where(Store.id == store_id))
     if store is None:
         raise HTTPException(status_code=404, detail='Course not found')
-    for store_key, store_value in store_data.dict().items():
+    check_version(store.version, parse_if_match(if_match))
+    for store_key, store_value in store_to_row(store_data).items():
         setattr(store, store_key, store_value)
-    db.commit()
-    db.refresh(store)
-    return store
+    try:
+        await db.commit()
+    except StaleDataError:
+        raise version_conflict()
+    await db.refresh(store)
+    await invalidate('store', store_id)
+    await invalidate('menu', store_id)
+    set_etag(response, store.version)
+    return store_to_record(row_to_dict(store))
+
+
+@stores_router.patch('/store/{store_id}/', response_model=StoreSchema)
+async def store_patch(store_id: int, store_data: StorePatchSchema, response: Response,
+                      if_match: Optional[str] = Header(None), db: AsyncSession = Depends(get_db)):
+    values = store_data.dict(exclude_unset=True)
+    if not values:
+        return await store_detail(store_id, response, db)
+    if 'store_description' in values:
+        values['description'] = values.pop('store_description')
+    store = await versioned_update(db, Store, store_id, values, parse_if_match(if_match))
+    if store is None:
+        raise HTTPException(status_code=404, detail='store not found')
+    await db.commit()
+    await invalidate('store', store_id)
+    await invalidate('menu', store_id)
+    set_etag(response, store.version)
+    return store_to_record(row_to_dict(store))
+
+
+def store_ids(store_id: int):
+    return select(Store.id).where(Store.id == store_id)
+
+
+async def purge_store_in_background(store_id: int):
+    async with AsyncSessionLocal() as db:
+        deleted = await cascaded_ids(db, store_ids(store_id))
+    await purge_store(store_id)
+    await invalidate_deleted(deleted)
 
 
 @stores_router.delete('/store/{store_id}/')
-async def store_delete(store_id: int, db: Session = Depends(get_db)):
-    store = db.query(Store).filter(Store.id == store_id).first()
+async def store_delete(store_id: int, background_tasks: BackgroundTasks, background: bool = False,
+                       db: AsyncSession = Depends(get_db)):
+    store = await db.scalar(select(Store).where(Store.id == store_id))
     if store is None:
         raise HTTPException(status_code=404, detail='store not found')
-    db.delete(store)
-    db.commit()
+    if background:
+        background_tasks.add_task(purge_store_in_background, store_id)
+        return JSONResponse(status_code=202, content={'message': 'store deletion scheduled'})
+    # passive_deletes: дети не грузятся в сессию, их удаляет ON DELETE CASCADE в базе
+    deleted = await cascaded_ids(db, store_ids(store_id))
+    await db.delete(store)
+    await db.commit()
+    await invalidate_deleted(deleted)
     return {'message': 'this store is deleted'}
\ No newline at end of file
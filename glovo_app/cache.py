@@ -0,0 +1,183 @@
+import asyncio
+import json
+import logging
+import time
+
+from fastapi import Response
+from fastapi.encoders import jsonable_encoder
+from redis.exceptions import RedisError
+from sqlalchemy import inspect
+
+from glovo_app.config import CACHE_LOCK_TTL_MS
+from glovo_app.db.pagination import NEXT_CURSOR_HEADER
+
+logger = logging.getLogger(__name__)
+
+redis_client = None
+
+# запросы одного воркера на один и тот же ключ ждут один общий Future
+_inflight: dict = {}
+
+
+def init_cache(client):
+    global redis_client
+    redis_client = client
+
+
+def row_to_dict(obj) -> dict:
+    state = inspect(obj, raiseerr=False)
+    if state is None:
+        # Row из select(колонки)
+        return jsonable_encoder(dict(obj._mapping))
+    return jsonable_encoder({attr.key: getattr(obj, attr.key) for attr in inspect(obj).mapper.column_attrs})
+
+
+def detail_key(namespace: str, object_id) -> str:
+    return f'catalog:{namespace}:{object_id}'
+
+
+async def versioned_detail_key(namespace: str, object_id) -> str:
+    # поколение читается до загрузки: читатель, начавший до записи, положит строку под старый ключ,
+    # который после invalidate уже никто не прочитает
+    base = detail_key(namespace, object_id)
+    generation = await redis_client.get(f'{base}:gen') or 0
+    return f'{base}:g{generation}'
+
+
+async def list_key(namespace: str, *parts) -> str:
+    version = await redis_client.get(f'catalog:{namespace}:version') or 0
+    suffix = ':'.join('' if part is None else str(part) for part in parts)
+    return f'catalog:{namespace}:v{version}:list:{suffix}'
+
+
+async def _load_with_lock(key: str, ttl: int, loader):
+    lock_key = f'lock:{key}'
+    if await redis_client.set(lock_key, '1', nx=True, px=CACHE_LOCK_TTL_MS):
+        try:
+            value = await loader()
+            await redis_client.set(key, json.dumps(value), ex=ttl)
+            return value
+        finally:
+            await redis_client.delete(lock_key)
+
+    # ключ грузит другой воркер — ждем его результат, а не идем в базу
+    deadline = time.monotonic() + CACHE_LOCK_TTL_MS / 1000
+    while time.monotonic() < deadline:
+        await asyncio.sleep(0.05)
+        raw = await redis_client.get(key)
+        if raw is not None:
+            return json.loads(raw)
+    return await loader()
+
+
+async def cached(key: str, ttl: int, loader):
+    if redis_client is None:
+        return await loader()
+    try:
+        raw = await redis_client.get(key)
+    except RedisError:
+        logger.warning('cache get failed for %s', key, exc_info=True)
+        return await loader()
+    if raw is not None:
+        return json.loads(raw)
+
+    future = _inflight.get(key)
+    if future is not None:
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            if not future.cancelled():
+                raise
+            return await loader()
+
+    future = asyncio.get_running_loop().create_future()
+    _inflight[key] = future
+    try:
+        try:
+            value = await _load_with_lock(key, ttl, loader)
+        except RedisError:
+            logger.warning('cache fill failed for %s', key, exc_info=True)
+            value = await loader()
+        future.set_result(value)
+        return value
+    except asyncio.CancelledError:
+        future.cancel()
+        raise
+    except Exception as exc:
+        future.set_exception(exc)
+        future.exception()
+        raise
+    finally:
+        _inflight.pop(key, None)
+
+
+async def cached_object(namespace: str, object_id, ttl: int, loader):
+    if redis_client is None:
+        return await loader()
+    try:
+        key = await versioned_detail_key(namespace, object_id)
+    except RedisError:
+        logger.warning('cache generation lookup failed for %s:%s', namespace, object_id, exc_info=True)
+        return await loader()
+    return await cached(key, ttl, loader)
+
+
+async def cached_detail(namespace: str, object_id, ttl: int, load_row):
+    async def loader():
+        row = await load_row()
+        return None if row is None else row_to_dict(row)
+
+    return await cached_object(namespace, object_id, ttl, loader)
+
+
+async def cached_page(namespace: str, parts: tuple, ttl: int, response: Response, load_rows):
+    async def loader():
+        page_response = Response()
+        rows = await load_rows(page_response)
+        return {'items': [row_to_dict(row) for row in rows],
+                'next_cursor': page_response.headers.get(NEXT_CURSOR_HEADER)}
+
+    if redis_client is None:
+        data = await loader()
+    else:
+        try:
+            key = await list_key(namespace, *parts)
+        except RedisError:
+            logger.warning('cache version lookup failed for %s', namespace, exc_info=True)
+            key = None
+        data = await (cached(key, ttl, loader) if key else loader())
+    if data['next_cursor']:
+        response.headers[NEXT_CURSOR_HEADER] = data['next_cursor']
+    return data['items']
+
+
+async def invalidate(namespace: str, object_id=None):
+    if redis_client is None:
+        return
+    try:
+        if object_id is not None:
+            await redis_client.incr(f'{detail_key(namespace, object_id)}:gen')
+        await redis_client.incr(f'catalog:{namespace}:version')
+    except RedisError:
+        logger.warning('cache invalidation failed for %s', namespace, exc_info=True)
+
+
+async def invalidate_many(namespace: str, object_ids):
+    if redis_client is None:
+        return
+    keys = [f'{detail_key(namespace, object_id)}:gen' for object_id in object_ids]
+    try:
+        if keys:
+            async with redis_client.pipeline(transaction=False) as pipe:
+                for key in keys:
+                    pipe.incr(key)
+                await pipe.execute()
+        await redis_client.incr(f'catalog:{namespace}:version')
+    except RedisError:
+        logger.warning('cache invalidation failed for %s', namespace, exc_info=True)
+
+
+async def invalidate_deleted(ids_by_namespace: dict):
+    # {namespace: [id, ...]} — после коммита удаления, иначе читатель успеет положить старую строку
+    for namespace, object_ids in ids_by_namespace.items():
+        await invalidate_many(namespace, object_ids)
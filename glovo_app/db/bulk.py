@@ -0,0 +1,111 @@
+import codecs
+import csv
+import io
+import json
+
+from fastapi import HTTPException
+from pydantic import ValidationError
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+
+from glovo_app.cache import row_to_dict
+from glovo_app.config import BULK_BATCH_SIZE
+from glovo_app.db.database import AsyncSessionLocal
+
+NDJSON = 'application/x-ndjson'
+CSV = 'text/csv'
+
+
+async def upsert_rows(db, model, rows: list):
+    # один INSERT ... ON CONFLICT (id) DO UPDATE на батч вместо add/commit/refresh на каждую строку
+    for start in range(0, len(rows), BULK_BATCH_SIZE):
+        # один id дважды в батче Postgres не пропустит (ON CONFLICT affect row a second time)
+        batch = list({row['id']: row for row in rows[start:start + BULK_BATCH_SIZE]}.values())
+        stmt = insert(model).values(batch)
+        columns = [key for key in batch[0] if key != 'id']
+        stmt = stmt.on_conflict_do_update(index_elements=[model.id],
+                                          set_={column: stmt.excluded[column] for column in columns})
+        await db.execute(stmt)
+
+
+async def _iter_lines(stream):
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    buffer = ''
+    async for chunk in stream:
+        buffer += decoder.decode(chunk)
+        *lines, buffer = buffer.split('\n')
+        for line in lines:
+            yield line
+    buffer += decoder.decode(b'', final=True)
+    if buffer:
+        yield buffer
+
+
+async def iter_records(stream, content_type: str):
+    lines = _iter_lines(stream)
+    if content_type.startswith(CSV):
+        header = None
+        pending = ''
+        async for line in lines:
+            # поле в кавычках может содержать перевод строки — склеиваем, пока кавычки не закроются
+            pending = f'{pending}\n{line}' if pending else line
+            if pending.count('"') % 2:
+                continue
+            record, pending = pending.rstrip('\r'), ''
+            if not record.strip():
+                continue
+            values = next(csv.reader([record]))
+            if header is None:
+                header = values
+                continue
+            yield {key: value if value != '' else None for key, value in zip(header, values)}
+    else:
+        async for line in lines:
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                raise HTTPException(status_code=422, detail='invalid json line')
+
+
+async def import_stream(db, model, schema, to_row, stream, content_type: str):
+    batch = []
+    ids = []
+    store_ids = set()
+    line_number = 0
+    async for record in iter_records(stream, content_type):
+        line_number += 1
+        try:
+            row = to_row(schema(**record))
+        except (ValidationError, ValueError, TypeError) as exc:
+            raise HTTPException(status_code=422, detail=f'record {line_number}: {exc}')
+        batch.append(row)
+        ids.append(row['id'])
+        store_ids.add(row['store_id'])
+        if len(batch) >= BULK_BATCH_SIZE:
+            await upsert_rows(db, model, batch)
+            batch = []
+    if batch:
+        await upsert_rows(db, model, batch)
+    return ids, store_ids
+
+
+async def export_stream(model, to_record, fmt: str):
+    # своя сессия: зависимость get_db закрывается до того, как StreamingResponse начнет отдавать тело
+    async with AsyncSessionLocal() as db:
+        result = await db.stream_scalars(select(model).order_by(model.id).execution_options(yield_per=BULK_BATCH_SIZE))
+        header_written = False
+        async for obj in result:
+            # to_record получает строку как из кеша (row_to_dict): Decimal уже число, а не "12.50"
+            record = to_record(row_to_dict(obj))
+            if fmt == 'csv':
+                out = io.StringIO()
+                writer = csv.DictWriter(out, fieldnames=list(record))
+                if not header_written:
+                    writer.writeheader()
+                    header_written = True
+                writer.writerow(record)
+                yield out.getvalue()
+            else:
+                yield json.dumps(record, ensure_ascii=False, default=str) + '\n'
@@ -0,0 +1,30 @@
+import math
+
+from sqlalchemy import func
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE = 111.32
+
+
+def planar_point(lat_column, lon_column):
+    # равнопромежуточная проекция: долгота сжата на cos(широты), евклидово расстояние в градусах ~ км / KM_PER_DEGREE.
+    # GiST по этому выражению отдает ближайших через ORDER BY <-> LIMIT; у полюсов и через 180-й меридиан неточно
+    return func.point(lon_column * func.cos(func.radians(lat_column)), lat_column)
+
+
+def planar_origin(latitude: float, longitude: float):
+    return func.point(longitude * math.cos(math.radians(latitude)), latitude)
+
+
+def planar_radius(radius_km: float) -> float:
+    return radius_km / KM_PER_DEGREE
+
+
+def distance_km(lat_column, lon_column, latitude: float, longitude: float):
+    # haversine в SQL
+    d_lat = func.radians(lat_column - latitude) / 2
+    d_lon = func.radians(lon_column - longitude) / 2
+    a = (func.power(func.sin(d_lat), 2)
+         + math.cos(math.radians(latitude)) * func.cos(func.radians(lat_column)) * func.power(func.sin(d_lon), 2))
+    return 2 * EARTH_RADIUS_KM * func.asin(func.sqrt(func.least(a, 1.0)))
+
@@ -1,8 +1,9 @@
-from sqlalchemy import Integer, String, ForeignKey, DateTime, Text, DECIMAL, Enum
+from sqlalchemy import Integer, String, ForeignKey, DateTime, Text, DECIMAL, Enum, Float, Boolean, Index, case
 from sqlalchemy.orm import relationship, Mapped, mapped_column
 from datetime import datetime
 from typing import Optional, List
 from glovo_app.db.database import Base
+from glovo_app.db.geo import planar_point
 from enum import Enum as PyEnum
 
 
@@ -32,6 +33,10 @@ class RatingStatus(str, PyEnum):
     rating5 = '5'
 
 
+def rating_value(column):
+    # рейтинг хранится как enum, для avg нужен int
+    return case(*((column == rating, int(rating.value)) for rating in RatingStatus))
+
 
 class UserProfile(Base):
     __tablename__ = "user_profiles"
@@ -44,19 +49,19 @@ class UserProfile(Base):
     phone_number: Mapped[Optional[str]] = mapped_column(String, nullable=True)
     age: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
     tokens: Mapped[List["RefreshToken"]] = relationship("RefreshToken", back_populates='user',
-                                                        cascade='all, delete')
+                                                        cascade='all, delete', passive_deletes=True)
 
     role: Mapped[UserRole] = mapped_column(Enum(UserRole), nullable=False, default=UserRole.client.value)
     store: Mapped[List["Store"]] = relationship("Store", back_populates='user',
-                                                        cascade='all, delete')
+                                                        cascade='all, delete', passive_deletes=True)
     # client: Mapped[List["Order"]] = relationship("Order", back_populates="clients_order",
     #                                              cascade="all, delete")
     # courier: Mapped[List["Order"]] = relationship("Order", back_populates="courier_order",
     #                                               cascade="all, delete")
     courier_user: Mapped[List["Courier"]] = relationship("Courier", back_populates='couriers',
-                                                        cascade='all, delete')
+                                                        cascade='all, delete', passive_deletes=True)
     clients: Mapped[List["StoreReview"]] = relationship("StoreReview", back_populates='client',
-                                                        cascade='all, delete')
+                                                        cascade='all, delete', passive_deletes=True)
     # client_review: Mapped[List["CourierReview"]] = relationship("CourierReview",
     #                                                             back_populates="clients_review",
     #                                                             cascade="all, delete")
@@ -69,9 +74,10 @@ class RefreshToken(Base):
     __tablename__ = "refresh_token"
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
-    token: Mapped[str] = mapped_column(String, nullable=False)
-    created_date: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
-    user_id: Mapped[int] = mapped_column(ForeignKey('user_profiles.id'))
+    # sha256 от токена, сам токен в базе не храним
+    token_hash: Mapped[str] = mapped_column(String(64), nullable=False, unique=True)
+    created_date: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, index=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey('user_profiles.id', ondelete='CASCADE'), index=True)
     user: Mapped['UserProfile'] = relationship('UserProfile', back_populates='tokens')
 
 
@@ -82,7 +88,7 @@ class Category(Base):
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     category_name: Mapped[str] = mapped_column(String(55))
     category: Mapped[List["Store"]] = relationship("Store", back_populates='category_store',
-                                                    cascade='all, delete')
+                                                    cascade='all, delete', passive_deletes=True)
 
 
 class Store(Base):
@@ -93,28 +99,46 @@ class Store(Base):
     store_image: Mapped[Optional[str]] = mapped_column(String, nullable=True)
     description: Mapped[str] = mapped_column(Text)
     address: Mapped[str] = mapped_column(String)
+    latitude: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
+    longitude: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
+    delivery_radius_km: Mapped[float] = mapped_column(Float, default=5, server_default='5')
+    is_open: Mapped[bool] = mapped_column(Boolean, default=True, server_default='true')
+    version: Mapped[int] = mapped_column(Integer, nullable=False, default=1, server_default='1')
 
-    user_id: Mapped[int] = mapped_column(ForeignKey('user_profiles.id'))
+    user_id: Mapped[int] = mapped_column(ForeignKey('user_profiles.id', ondelete='CASCADE'))
     user: Mapped['UserProfile'] = relationship('UserProfile', back_populates='store')
-    category_id: Mapped[int] = mapped_column(ForeignKey('category.id'))
+    category_id: Mapped[int] = mapped_column(ForeignKey('category.id', ondelete='CASCADE'))
     category_store: Mapped['Category'] = relationship('Category', back_populates='category')
     contact_store: Mapped[List["ContactInfo"]] = relationship("ContactInfo", back_populates='contact_infos',
-                                                   cascade='all, delete')
+                                                   cascade='all, delete', passive_deletes=True)
     product: Mapped[List["Product"]] = relationship("Product", back_populates='product_store',
-                                                   cascade='all, delete')
+                                                   cascade='all, delete', passive_deletes=True)
     product_combo: Mapped[List["ProductCombo"]] = relationship("ProductCombo", back_populates='product_store',
-                                                               cascade='all, delete')
+                                                               cascade='all, delete', passive_deletes=True)
     store: Mapped[List["StoreReview"]] = relationship("StoreReview", back_populates='store_reviews',
-                                                      cascade='all, delete')
+                                                      cascade='all, delete', passive_deletes=True)
+
+    # (fk, id): фильтр по владельцу/категории + keyset по id в одном индексе
+    __table_args__ = (Index('ix_store_category_id_id', 'category_id', 'id'),
+                      Index('ix_store_user_id_id', 'user_id', 'id'))
+    # UPDATE ... WHERE version = :old, иначе StaleDataError
+    __mapper_args__ = {'version_id_col': version}
+
+
+# поиск ближайших: GiST по точке отдает строки в порядке расстояния (KNN), без сортировки всего круга
+Index('ix_store_location_knn', planar_point(Store.latitude, Store.longitude), postgresql_using='gist')
+
 
 class ContactInfo(Base):
     __tablename__ = "contact_info"
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     contact_number: Mapped[Optional[str]] = mapped_column(String, nullable=True)
-    store_id: Mapped[int] = mapped_column(ForeignKey('store.id'))
+    store_id: Mapped[int] = mapped_column(ForeignKey('store.id', ondelete='CASCADE'))
     contact_infos: Mapped['Store'] = relationship('Store', back_populates='contact_store')
 
+    __table_args__ = (Index('ix_contact_info_store_id', 'store_id'),)
+
 
 class Product(Base):
     __tablename__ = "products"
@@ -124,9 +148,11 @@ class Product(Base):
     product_image: Mapped[Optional[str]] = mapped_column(String, nullable=True)
     price: Mapped[DECIMAL] = mapped_column(DECIMAL(8, 2))
     description: Mapped[str] = mapped_column(Text)
-    store_id: Mapped[int] = mapped_column(ForeignKey('store.id'))
+    store_id: Mapped[int] = mapped_column(ForeignKey('store.id', ondelete='CASCADE'))
     product_store: Mapped['Store'] = relationship('Store', back_populates='product')
 
+    __table_args__ = (Index('ix_products_store_id_id', 'store_id', 'id'),)
+
 
 class ProductCombo(Base):
     __tablename__ = "product_combo"
@@ -136,22 +162,52 @@ class ProductCombo(Base):
     combo_image: Mapped[Optional[str]] = mapped_column(String, nullable=True)
     price: Mapped[DECIMAL] = mapped_column(DECIMAL(8, 2))
     description: Mapped[str] = mapped_column(Text)
-    store_id: Mapped[int] = mapped_column(ForeignKey('store.id'))
+    store_id: Mapped[int] = mapped_column(ForeignKey('store.id', ondelete='CASCADE'))
     product_store: Mapped['Store'] = relationship('Store', back_populates='product_combo')
 
+    __table_args__ = (Index('ix_product_combo_store_id_id', 'store_id', 'id'),)
+
 
 
 class Order(Base):
     __tablename__ = "orders"
 
-    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True, index=True)
     role: Mapped[OrderStatus] = mapped_column(Enum(OrderStatus), nullable=False, default=OrderStatus.tim1.value)
     delivery_address: Mapped[str] = mapped_column(String)
-    created_date: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    delivery_latitude: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
+    delivery_longitude: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
+    # время создания и ключ месячных партиций (glovo_app/db/partitions.py); смены статусов — в order_events
+    created_date: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, primary_key=True)
     # client_id: Mapped[int] = mapped_column(ForeignKey('user_profiles.id'))
     # clients: Mapped['UserProfile'] = relationship('UserProfile', back_populates='client')
-    # courier_id: Mapped[int] = mapped_column(ForeignKey('user_profiles.id'))
+    # назначает dispatch, до этого NULL
+    courier_id: Mapped[Optional[int]] = mapped_column(ForeignKey('user_profiles.id', ondelete='SET NULL'),
+                                                      nullable=True, index=True)
     # courier: Mapped['UserProfile'] = relationship('UserProfile', back_populates='courier')
+    version: Mapped[int] = mapped_column(Integer, nullable=False, default=1, server_default='1')
+
+    # списки идут по (created_date, id) desc, с фильтром по статусу и без
+    __table_args__ = (Index('ix_orders_role_created_date', 'role', 'created_date', 'id'),
+                      Index('ix_orders_created_date', 'created_date', 'id'),
+                      {'postgresql_partition_by': 'RANGE (created_date)'})
+    __mapper_args__ = {'version_id_col': version}
+
+
+class OrderEvent(Base):
+    # append-only история статусов: строки только добавляются, по ним считается время доставки
+    __tablename__ = "order_events"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    # без FK: ключ партиционированной orders — (id, created_date); события удаляются вместе с заказом
+    # в order_delete и уходят в архив вместе с партицией заказов в archive_partitions
+    order_id: Mapped[int] = mapped_column(Integer)
+    # NULL у события создания заказа
+    from_status: Mapped[Optional[OrderStatus]] = mapped_column(Enum(OrderStatus), nullable=True)
+    to_status: Mapped[OrderStatus] = mapped_column(Enum(OrderStatus), nullable=False)
+    created_date: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (Index('ix_order_events_order_id_created_date', 'order_id', 'created_date'),)
 
 
 class Courier(Base):
@@ -160,31 +216,73 @@ class Courier(Base):
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     status_courier: Mapped[CourierStatus] = mapped_column(Enum(CourierStatus), nullable=False,
                                                           default=CourierStatus.cour1.value)
-    courier_id: Mapped[int] = mapped_column(ForeignKey('user_profiles.id'))
+    courier_id: Mapped[int] = mapped_column(ForeignKey('user_profiles.id', ondelete='CASCADE'))
     couriers: Mapped['UserProfile'] = relationship('UserProfile', back_populates='courier_user')
+    latitude: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
+    longitude: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
+
+    __table_args__ = (Index('ix_couriers_courier_id', 'courier_id'),
+                      Index('ix_couriers_status_courier_id', 'status_courier', 'id'))
 
 
 class StoreReview(Base):
     __tablename__ = "store_review"
 
-    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True, index=True)
     rating: Mapped[RatingStatus] = mapped_column(Enum(RatingStatus), nullable=False, default=RatingStatus.rating5.value)
     commend: Mapped[str] = mapped_column(Text)
-    created_date: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
-    client_id: Mapped[int] = mapped_column(ForeignKey("user_profiles.id"))
+    created_date: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, primary_key=True)
+    client_id: Mapped[int] = mapped_column(ForeignKey("user_profiles.id", ondelete='CASCADE'))
     client = relationship("UserProfile", back_populates="clients")
-    store_id: Mapped[int] = mapped_column(ForeignKey('store.id'))
+    store_id: Mapped[int] = mapped_column(ForeignKey('store.id', ondelete='CASCADE'))
     store_reviews: Mapped['Store'] = relationship('Store', back_populates='store')
 
+    __table_args__ = (Index('ix_store_review_store_id_created_date', 'store_id', 'created_date', 'id'),
+                      Index('ix_store_review_created_date', 'created_date', 'id'),
+                      Index('ix_store_review_client_id', 'client_id'),
+                      {'postgresql_partition_by': 'RANGE (created_date)'})
+
 
 class CourierReview(Base):
     __tablename__ = "courier_review"
 
-    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True, index=True)
     # client_id: Mapped[int] = mapped_column(ForeignKey("user_profiles.id"))
     # client = relationship("UserProfile", back_populates="client_review")
-    # courier_id: Mapped[int] = mapped_column(ForeignKey('user_profiles.id'))
+    courier_id: Mapped[Optional[int]] = mapped_column(ForeignKey('user_profiles.id', ondelete='SET NULL'),
+                                                      nullable=True)
     # courier: Mapped['UserProfile'] = relationship('UserProfile', back_populates='courier_review')
     rating: Mapped[RatingStatus] = mapped_column(Enum(RatingStatus), nullable=False, default=RatingStatus.rating5.value)
     commend: Mapped[str] = mapped_column(Text)
-    created_date: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
\ No newline at end of file
+    created_date: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, primary_key=True)
+
+    __table_args__ = (Index('ix_courier_review_courier_id', 'courier_id'),
+                      Index('ix_courier_review_created_date', 'created_date', 'id'),
+                      {'postgresql_partition_by': 'RANGE (created_date)'})
+
+
+class RatingAggregateMixin:
+    # обновляется в той же транзакции, что и отзыв (glovo_app/db/ratings.py)
+    review_count: Mapped[int] = mapped_column(Integer, default=0, server_default='0')
+    rating_sum: Mapped[int] = mapped_column(Integer, default=0, server_default='0')
+    star_1: Mapped[int] = mapped_column(Integer, default=0, server_default='0')
+    star_2: Mapped[int] = mapped_column(Integer, default=0, server_default='0')
+    star_3: Mapped[int] = mapped_column(Integer, default=0, server_default='0')
+    star_4: Mapped[int] = mapped_column(Integer, default=0, server_default='0')
+    star_5: Mapped[int] = mapped_column(Integer, default=0, server_default='0')
+
+    @property
+    def avg_rating(self) -> Optional[float]:
+        return round(self.rating_sum / self.review_count, 2) if self.review_count else None
+
+
+class StoreRating(RatingAggregateMixin, Base):
+    __tablename__ = "store_rating"
+
+    store_id: Mapped[int] = mapped_column(ForeignKey('store.id', ondelete='CASCADE'), primary_key=True)
+
+
+class CourierRating(RatingAggregateMixin, Base):
+    __tablename__ = "courier_rating"
+
+    courier_id: Mapped[int] = mapped_column(ForeignKey('user_profiles.id', ondelete='CASCADE'), primary_key=True)
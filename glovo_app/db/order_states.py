@@ -0,0 +1,97 @@
+from datetime import datetime, timezone
+from typing import Optional
+
+from fastapi import HTTPException, status
+from sqlalchemy import bindparam, func, insert, select, update
+
+from glovo_app.db.models import Order, OrderEvent, OrderStatus, Courier, CourierStatus
+from glovo_app.db.versioning import version_conflict
+
+# Ожидает обработки -> В процессе доставки -> Доставлен, отменить можно до доставки
+TRANSITIONS = {
+    OrderStatus.tim1: {OrderStatus.tim2, OrderStatus.tim4},
+    OrderStatus.tim2: {OrderStatus.tim3, OrderStatus.tim4},
+    OrderStatus.tim3: set(),
+    OrderStatus.tim4: set(),
+}
+# после них курьер заказа снова свободен для dispatch
+FINAL_STATUSES = {OrderStatus.tim3, OrderStatus.tim4}
+
+
+def check_transition(order_id: int, old: OrderStatus, new: OrderStatus):
+    if new not in TRANSITIONS[old]:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT,
+                            detail=f'order {order_id}: transition {old.value!r} -> {new.value!r} is not allowed')
+
+
+async def release_couriers(db, courier_ids):
+    # courier_ids — user_profiles.id, как в orders.courier_id; в той же транзакции, что и смена статуса
+    courier_ids = {courier_id for courier_id in courier_ids if courier_id is not None}
+    if courier_ids:
+        await db.execute(update(Courier)
+                         .where(Courier.courier_id.in_(courier_ids), Courier.status_courier == CourierStatus.cour2)
+                         .values(status_courier=CourierStatus.cour1)
+                         .execution_options(synchronize_session=False))
+
+
+def utc_naive(moment: datetime) -> datetime:
+    # в базе naive UTC; время со смещением сначала переводим в UTC, naive считаем уже UTC
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment
+
+
+def event_row(order_id: int, old: Optional[OrderStatus], new: OrderStatus, occurred_at: Optional[datetime] = None,
+              not_before: Optional[datetime] = None):
+    now = datetime.utcnow()
+    # время из будущего не принимаем, иначе аналитика доставки поедет
+    at = min(utc_naive(occurred_at), now) if occurred_at is not None else now
+    # и раньше создания заказа / предыдущего события тоже: журнал должен идти по порядку
+    if not_before is not None:
+        at = max(at, not_before)
+    return {'order_id': order_id, 'from_status': old, 'to_status': new, 'created_date': at}
+
+
+async def apply_transitions(db, transitions) -> dict:
+    # transitions: [(order_id, role, occurred_at, expected_version)], применяются по порядку;
+    # один заказ может пройти несколько шагов за батч. Возвращает {order_id: (role, version)}
+    order_ids = sorted({order_id for order_id, *_ in transitions})
+    # блокировки в порядке id — два батча с пересекающимися заказами не зайдут в deadlock
+    rows = (await db.execute(select(Order.id, Order.role, Order.version, Order.created_date, Order.courier_id)
+                             .where(Order.id.in_(order_ids))
+                             .order_by(Order.id)
+                             .with_for_update())).all()
+    state = {row.id: row.role for row in rows}
+    versions = {row.id: row.version for row in rows}
+    couriers = {row.id: row.courier_id for row in rows}
+    missing = set(order_ids) - state.keys()
+    if missing:
+        raise HTTPException(status_code=404, detail=f'orders not found: {sorted(missing)}')
+    last_seen = {row.id: row.created_date for row in rows}
+    last_events = await db.execute(select(OrderEvent.order_id, func.max(OrderEvent.created_date))
+                                   .where(OrderEvent.order_id.in_(order_ids))
+                                   .group_by(OrderEvent.order_id))
+    for order_id, last_event_at in last_events:
+        if last_event_at is not None:
+            last_seen[order_id] = max(last_seen[order_id], last_event_at)
+
+    events = []
+    for order_id, role, occurred_at, expected_version in transitions:
+        if expected_version is not None and expected_version != versions[order_id]:
+            raise version_conflict()
+        check_transition(order_id, state[order_id], role)
+        event = event_row(order_id, state[order_id], role, occurred_at, not_before=last_seen[order_id])
+        events.append(event)
+        state[order_id] = role
+        last_seen[order_id] = event['created_date']
+
+    # строки уже заблокированы: по одному UPDATE на заказ в одном executemany, version + 1
+    order_table = Order.__table__
+    await db.execute(update(order_table)
+                     .where(order_table.c.id == bindparam('b_id'))
+                     .values(role=bindparam('b_role'), version=order_table.c.version + 1),
+                     [{'b_id': order_id, 'b_role': state[order_id]} for order_id in order_ids])
+    await db.execute(insert(OrderEvent), events)
+    # из финальных статусов переходов нет: в FINAL_STATUSES заказ попал именно в этом батче
+    await release_couriers(db, [couriers[order_id] for order_id in order_ids if state[order_id] in FINAL_STATUSES])
+    return {order_id: (state[order_id], versions[order_id] + 1) for order_id in order_ids}
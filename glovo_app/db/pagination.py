@@ -0,0 +1,94 @@
+import base64
+import json
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+
+from fastapi import HTTPException, Query, Response
+from sqlalchemy import tuple_
+
+from glovo_app.config import PAGE_SIZE_DEFAULT, PAGE_SIZE_MAX
+
+NEXT_CURSOR_HEADER = 'X-Next-Cursor'
+
+
+@dataclass
+class PageParams:
+    cursor: Optional[str]
+    limit: int
+
+
+def page_params(cursor: Optional[str] = None,
+                limit: int = Query(PAGE_SIZE_DEFAULT, ge=1, le=PAGE_SIZE_MAX)) -> PageParams:
+    return PageParams(cursor=cursor, limit=limit)
+
+
+def _invalid_cursor():
+    return HTTPException(status_code=400, detail='invalid cursor')
+
+
+def encode_cursor(*values) -> str:
+    raw = json.dumps(values, default=lambda value: value.isoformat(), separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str, size: int) -> list:
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except ValueError:
+        raise _invalid_cursor()
+    if not isinstance(values, list) or len(values) != size:
+        raise _invalid_cursor()
+    return values
+
+
+def _finish(rows, page: PageParams, response: Response, cursor_of):
+    rows = list(rows)
+    if len(rows) > page.limit:
+        rows = rows[:page.limit]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(*cursor_of(rows[-1]))
+    return rows
+
+
+def keyset_by_id(stmt, model, page: PageParams):
+    if page.cursor:
+        (last_id,) = decode_cursor(page.cursor, 1)
+        if not isinstance(last_id, int):
+            raise _invalid_cursor()
+        stmt = stmt.where(model.id > last_id)
+    return stmt.order_by(model.id).limit(page.limit + 1)
+
+
+def keyset_by_created(stmt, model, page: PageParams):
+    if page.cursor:
+        created_date, last_id = decode_cursor(page.cursor, 2)
+        try:
+            created_date = datetime.fromisoformat(created_date)
+        except (TypeError, ValueError):
+            raise _invalid_cursor()
+        if not isinstance(last_id, int):
+            raise _invalid_cursor()
+        stmt = stmt.where(tuple_(model.created_date, model.id) < (created_date, last_id))
+    return stmt.order_by(model.created_date.desc(), model.id.desc()).limit(page.limit + 1)
+
+
+async def paginate_by_id(db, stmt, model, page: PageParams, response: Response):
+    rows = (await db.scalars(keyset_by_id(stmt, model, page))).all()
+    return _finish(rows, page, response, lambda row: (row.id,))
+
+
+async def paginate_by_created(db, stmt, model, page: PageParams, response: Response):
+    rows = (await db.scalars(keyset_by_created(stmt, model, page))).all()
+    return _finish(rows, page, response, lambda row: (row.created_date, row.id))
+
+
+# то же для select(колонки): строки-кортежи без identity map
+async def paginate_rows_by_id(db, stmt, model, page: PageParams, response: Response):
+    rows = (await db.execute(keyset_by_id(stmt, model, page))).all()
+    return _finish(rows, page, response, lambda row: (row.id,))
+
+
+async def paginate_rows_by_created(db, stmt, model, page: PageParams, response: Response):
+    rows = (await db.execute(keyset_by_created(stmt, model, page))).all()
+    return _finish(rows, page, response, lambda row: (row.created_date, row.id))
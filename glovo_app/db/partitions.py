@@ -0,0 +1,203 @@
+import argparse
+import asyncio
+import gzip
+import logging
+import os
+import re
+from datetime import date, datetime
+
+from sqlalchemy import text
+
+from glovo_app.config import PARTITION_MONTHS_AHEAD, PARTITION_MAINTENANCE_INTERVAL, ARCHIVE_DIR
+from glovo_app.db.database import AsyncSessionLocal, async_engine
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+logger = logging.getLogger(__name__)
+
+PARTITIONED_TABLES = ('orders', 'store_review', 'courier_review')
+# любое число, одинаковое у всех воркеров: создание партиций идет по очереди
+PARTITION_LOCK_KEY = 72310524
+ARCHIVE_BATCH = 10000
+
+
+def month_start(value) -> date:
+    return date(value.year, value.month, 1)
+
+
+def add_months(month: date, count: int) -> date:
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(table: str, month: date) -> str:
+    return f'{table}_y{month.year}m{month.month:02d}'
+
+
+def partition_month(table: str, name: str):
+    match = re.fullmatch(rf'{table}_y(\d{{4}})m(\d{{2}})', name)
+    return date(int(match[1]), int(match[2]), 1) if match else None
+
+
+def partition_ddl(table: str, month: date) -> str:
+    return (f"CREATE TABLE IF NOT EXISTS {partition_name(table, month)} PARTITION OF {table} "
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')")
+
+
+async def _attached_partitions(db):
+    rows = await db.execute(text(
+        "SELECT parent.relname, child.relname FROM pg_inherits "
+        "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+        "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+        "WHERE parent.relname = ANY(:tables) ORDER BY child.relname"), {'tables': list(PARTITIONED_TABLES)})
+    return rows.all()
+
+
+async def ensure_partitions(months_ahead: int = PARTITION_MONTHS_AHEAD) -> int:
+    # текущий месяц + months_ahead вперед; вставка в месяц без партиции упала бы с ошибкой
+    current = month_start(datetime.utcnow())
+    months = [add_months(current, offset) for offset in range(months_ahead + 1)]
+    async with AsyncSessionLocal() as db:
+        async with db.begin():
+            await db.execute(text('SELECT pg_advisory_xact_lock(:key)'), {'key': PARTITION_LOCK_KEY})
+            existing = {partition for _, partition in await _attached_partitions(db)}
+            created = 0
+            for table in PARTITIONED_TABLES:
+                for month in months:
+                    if partition_name(table, month) not in existing:
+                        await db.execute(text(partition_ddl(table, month)))
+                        created += 1
+    return created
+
+
+async def run_partition_maintainer(interval: int = PARTITION_MAINTENANCE_INTERVAL):
+    while True:
+        try:
+            created = await ensure_partitions()
+            if created:
+                logger.info('created %s partitions', created)
+        except Exception:
+            logger.exception('partition maintenance failed')
+        await asyncio.sleep(interval)
+
+
+async def _detached_partitions(db):
+    # отсоединены, но не удалены: прошлый запуск упал между DETACH и DROP
+    rows = await db.execute(text(
+        "SELECT relname FROM pg_class WHERE relkind = 'r' AND NOT relispartition "
+        "AND relname ~ :pattern ORDER BY relname"),
+        {'pattern': rf"^({'|'.join(PARTITIONED_TABLES)})_y\d{{4}}m\d{{2}}$"})
+    return [(name.rsplit('_y', 1)[0], name) for name in rows.scalars()]
+
+
+def _fsync(path: str):
+    with open(path, 'rb') as written:
+        os.fsync(written.fileno())
+
+
+async def _export_csv(query: str, path: str):
+    # COPY (query) TO STDOUT потоком в gzip, в памяти только текущий кусок
+    async with async_engine.connect() as conn:
+        raw = (await conn.get_raw_connection()).driver_connection
+        with gzip.open(path, 'wb') as out:
+            async def write(chunk):
+                out.write(chunk)
+
+            await raw.copy_from_query(query, output=write, format='csv', header=True)
+
+
+async def _export_parquet(query: str, path: str):
+    async with async_engine.connect() as conn:
+        result = await conn.stream(text(query))
+        writer = None
+        try:
+            async for rows in result.partitions(ARCHIVE_BATCH):
+                batch = pa.Table.from_pylist([dict(row._mapping) for row in rows])
+                if writer is None:
+                    writer = pq.ParquetWriter(path, batch.schema, compression='zstd')
+                writer.write_table(batch)
+        finally:
+            if writer is not None:
+                writer.close()
+
+
+async def _export(query: str, path: str, file_format: str):
+    # пишем во временный файл, fsync, rename: DROP идет только после того, как архив на диске
+    partial = f'{path}.partial'
+    if file_format == 'parquet':
+        await _export_parquet(query, partial)
+    else:
+        await _export_csv(query, partial)
+    _fsync(partial)
+    os.replace(partial, path)
+    directory = os.open(os.path.dirname(path) or '.', os.O_RDONLY)
+    try:
+        os.fsync(directory)
+    finally:
+        os.close(directory)
+
+
+async def archive_partitions(older_than_months: int, out_dir: str = ARCHIVE_DIR, file_format: str = 'csv',
+                             keep: bool = False) -> list:
+    # партиции целиком старше cutoff: сначала DETACH — после него в партицию уже ничего не запишется
+    # (вставка в этот месяц упадет, UPDATE/DELETE через родителя ее не видят), потом выгрузка и DROP
+    if file_format == 'parquet' and pa is None:
+        raise RuntimeError('parquet export needs pyarrow')
+    cutoff = add_months(month_start(datetime.utcnow()), -older_than_months)
+    extension = 'parquet' if file_format == 'parquet' else 'csv.gz'
+    os.makedirs(out_dir, exist_ok=True)
+    archived = []
+    async with AsyncSessionLocal() as db:
+        attached = await _attached_partitions(db)
+        detached = await _detached_partitions(db)
+    candidates = [(table, partition, True) for table, partition in attached]
+    if not keep:
+        candidates += [(table, partition, False) for table, partition in detached]
+    for table, partition, is_attached in candidates:
+        month = partition_month(table, partition)
+        if month is None or add_months(month, 1) > cutoff:
+            continue
+        if is_attached:
+            async with AsyncSessionLocal() as db:
+                async with db.begin():
+                    await db.execute(text(f'ALTER TABLE {table} DETACH PARTITION {partition}'))
+        paths = [os.path.join(out_dir, f'{partition}.{extension}')]
+        await _export(f'SELECT * FROM {partition}', paths[0], file_format)
+        # у order_events нет FK на orders: события архивных заказов уходят в архив вместе с ними
+        owned_events = f'order_events WHERE order_id IN (SELECT id FROM {partition})'
+        if table == 'orders':
+            paths.append(os.path.join(out_dir, f'{partition}_events.{extension}'))
+            await _export(f'SELECT * FROM {owned_events}', paths[1], file_format)
+        if not keep:
+            async with AsyncSessionLocal() as db:
+                async with db.begin():
+                    if table == 'orders':
+                        await db.execute(text(f'DELETE FROM {owned_events}'))
+                    await db.execute(text(f'DROP TABLE {partition}'))
+        logger.info('archived %s to %s', partition, ', '.join(paths))
+        archived.extend(paths)
+    return archived
+
+
+if __name__ == '__main__':
+    # python -m glovo_app.db.partitions ensure
+    # python -m glovo_app.db.partitions archive --older-than 12 --format parquet
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser()
+    commands = parser.add_subparsers(dest='command', required=True)
+    ensure_parser = commands.add_parser('ensure')
+    ensure_parser.add_argument('--months-ahead', type=int, default=PARTITION_MONTHS_AHEAD)
+    archive_parser = commands.add_parser('archive')
+    archive_parser.add_argument('--older-than', type=int, required=True, help='months')
+    archive_parser.add_argument('--out', default=ARCHIVE_DIR)
+    archive_parser.add_argument('--format', choices=['csv', 'parquet'], default='csv')
+    archive_parser.add_argument('--keep', action='store_true', help='detach only, do not drop')
+    args = parser.parse_args()
+    if args.command == 'ensure':
+        logger.info('created %s partitions', asyncio.run(ensure_partitions(args.months_ahead)))
+    else:
+        asyncio.run(archive_partitions(args.older_than, args.out, args.format, args.keep))
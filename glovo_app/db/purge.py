@@ -0,0 +1,94 @@
+import asyncio
+import logging
+import sys
+from collections import Counter
+
+from sqlalchemy import delete, select
+
+from glovo_app.config import DELETE_BATCH_SIZE
+from glovo_app.db.database import AsyncSessionLocal
+from glovo_app.db.models import (UserProfile, Category, Store, ContactInfo, Product, ProductCombo, StoreReview,
+                                 StoreRating, Courier, RefreshToken)
+from glovo_app.db.ratings import apply_rating
+from glovo_app.token_cache import token_cache
+
+logger = logging.getLogger(__name__)
+
+
+async def delete_in_batches(model, condition, batch_size: int = DELETE_BATCH_SIZE, returning=(),
+                            on_deleted=None) -> int:
+    # каждый батч — своя короткая транзакция: блокировки и WAL ограничены batch_size строками
+    table = model.__table__
+    total = 0
+    while True:
+        async with AsyncSessionLocal() as db:
+            ids = select(table.c.id).where(condition).limit(batch_size).scalar_subquery()
+            stmt = delete(table).where(table.c.id.in_(ids)).returning(table.c.id, *returning)
+            rows = (await db.execute(stmt)).all()
+            if on_deleted is not None and rows:
+                await on_deleted(db, rows)
+            await db.commit()
+        total += len(rows)
+        if len(rows) < batch_size:
+            return total
+        await asyncio.sleep(0)
+
+
+async def cascaded_ids(db, store_ids) -> dict:
+    # строки, которые удалит ON DELETE CASCADE или _purge_stores: приложение их не грузит,
+    # а их detail- и menu-ключи в кеше нужно сдвинуть. Выборки по индексам на store_id
+    stores = (await db.scalars(select(Store.id).where(Store.id.in_(store_ids)))).all()
+    return {
+        'store': stores,
+        'menu': stores,
+        'product': (await db.scalars(select(Product.id).where(Product.store_id.in_(stores)))).all(),
+        'product_combo': (await db.scalars(select(ProductCombo.id)
+                                           .where(ProductCombo.store_id.in_(stores)))).all(),
+    }
+
+
+async def _unrate_store_reviews(db, rows):
+    # отзывы клиента на чужие магазины: агрегаты этих магазинов каскадом не удаляются
+    for (store_id, rating), count in Counter((row.store_id, row.rating) for row in rows).items():
+        await apply_rating(db, StoreRating, StoreRating.store_id, store_id, rating, -count)
+
+
+async def _purge_stores(store_ids) -> int:
+    # сначала дети пачками, тогда каскад на самих магазинах уже ничего не трогает
+    total = 0
+    for model in (ContactInfo, Product, ProductCombo, StoreReview):
+        total += await delete_in_batches(model, model.store_id.in_(store_ids))
+    return total + await delete_in_batches(Store, Store.id.in_(store_ids))
+
+
+async def purge_store(store_id: int) -> int:
+    return await _purge_stores(select(Store.id).where(Store.id == store_id))
+
+
+async def purge_category(category_id: int) -> int:
+    total = await _purge_stores(select(Store.id).where(Store.category_id == category_id))
+    return total + await delete_in_batches(Category, Category.id == category_id)
+
+
+async def purge_owner(user_id: int) -> int:
+    total = await _purge_stores(select(Store.id).where(Store.user_id == user_id))
+    total += await delete_in_batches(StoreReview, StoreReview.client_id == user_id,
+                                     returning=(StoreReview.store_id, StoreReview.rating),
+                                     on_deleted=_unrate_store_reviews)
+    for model, column in ((RefreshToken, RefreshToken.user_id), (Courier, Courier.courier_id)):
+        total += await delete_in_batches(model, column == user_id)
+    # orders/courier_review.courier_id обнулит ON DELETE SET NULL
+    total += await delete_in_batches(UserProfile, UserProfile.id == user_id)
+    token_cache.invalidate_user(user_id)
+    return total
+
+
+PURGES = {'store': purge_store, 'category': purge_category, 'owner': purge_owner}
+
+
+if __name__ == '__main__':
+    # python -m glovo_app.db.purge category 12
+    logging.basicConfig(level=logging.INFO)
+    kind, object_id = sys.argv[1], int(sys.argv[2])
+    deleted = asyncio.run(PURGES[kind](object_id))
+    logger.info('%s %s purged, %s rows deleted', kind, object_id, deleted)
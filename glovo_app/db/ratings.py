@@ -0,0 +1,72 @@
+import asyncio
+import logging
+
+from sqlalchemy import delete, func, insert as core_insert, select, text
+from sqlalchemy.dialects.postgresql import insert
+
+from glovo_app.db.database import AsyncSessionLocal
+from glovo_app.db.models import (StoreRating, CourierRating, StoreReview, CourierReview, RatingStatus,
+                                 rating_value)
+
+logger = logging.getLogger(__name__)
+
+STAR_COLUMNS = ['star_1', 'star_2', 'star_3', 'star_4', 'star_5']
+
+
+def _stars(rating) -> int:
+    return int(RatingStatus(rating).value)
+
+
+async def apply_rating(db, model, key_column, key, rating, sign: int):
+    # INSERT ... ON CONFLICT DO UPDATE SET x = x + delta — без чтения строк отзывов
+    if key is None or rating is None:
+        return
+    stars = _stars(rating)
+    values = {key_column.key: key, 'review_count': sign, 'rating_sum': sign * stars,
+              **{column: 0 for column in STAR_COLUMNS}}
+    values[f'star_{stars}'] = sign
+    stmt = insert(model).values(**values)
+    counters = ['review_count', 'rating_sum', f'star_{stars}']
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[key_column],
+        set_={column: getattr(model, column) + stmt.excluded[column] for column in counters},
+    )
+    await db.execute(stmt)
+
+
+async def move_rating(db, model, key_column, old_key, old_rating, new_key, new_rating):
+    if old_key == new_key and old_rating is not None and new_rating is not None \
+            and _stars(old_rating) == _stars(new_rating):
+        return
+    await apply_rating(db, model, key_column, old_key, old_rating, -1)
+    await apply_rating(db, model, key_column, new_key, new_rating, +1)
+
+
+def _aggregate_select(review_model, key_column):
+    stars = rating_value(review_model.rating)
+    return (select(key_column, func.count(), func.sum(stars),
+                   *(func.count().filter(stars == number) for number in range(1, 6)))
+            .where(key_column.is_not(None))
+            .group_by(key_column))
+
+
+async def rebuild_ratings():
+    # сверка: пересчитываем агрегаты целиком из отзывов одним INSERT ... SELECT на таблицу
+    columns = ['review_count', 'rating_sum', *STAR_COLUMNS]
+    async with AsyncSessionLocal() as db:
+        async with db.begin():
+            for model, key_name, review_model, key_column in [
+                (StoreRating, 'store_id', StoreReview, StoreReview.store_id),
+                (CourierRating, 'courier_id', CourierReview, CourierReview.courier_id),
+            ]:
+                # отзывы, которые коммитятся во время пересчета, дождутся его и применят свою дельту после
+                await db.execute(text(f'LOCK TABLE {model.__tablename__} IN EXCLUSIVE MODE'))
+                await db.execute(delete(model))
+                await db.execute(core_insert(model.__table__)
+                                 .from_select([key_name, *columns], _aggregate_select(review_model, key_column)))
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(rebuild_ratings())
+    logger.info('rating aggregates rebuilt')
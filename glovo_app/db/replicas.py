@@ -0,0 +1,111 @@
+import asyncio
+import itertools
+import logging
+import time
+
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError, TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import async_sessionmaker, AsyncSession
+
+from glovo_app.config import REPLICA_HEALTH_INTERVAL, REPLICA_RETRY_AFTER, REPLICA_MAX_LAG, READ_YOUR_WRITES_SECONDS
+
+logger = logging.getLogger(__name__)
+
+PRIMARY_COOKIE = 'db_primary'
+PRIMARY_HEADER = 'x-read-primary'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# на primary pg_last_xact_replay_timestamp() = NULL, lag 0
+LAG_QUERY = text('SELECT COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)')
+
+
+class ReplicaRouter:
+    # round-robin по живым репликам; упавшая или отставшая реплика выпадает до следующей проверки
+    def __init__(self, engines):
+        self.engines = engines
+        self._sessions = [async_sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+                          for engine in engines]
+        self._counter = itertools.count()
+        self._down_until = [0.0] * len(engines)
+        self._lag = [None] * len(engines)
+        self.failovers = 0
+
+    def _candidates(self):
+        now = time.monotonic()
+        start = next(self._counter)
+        order = ((start + offset) % len(self.engines) for offset in range(len(self.engines)))
+        return [index for index in order if self._down_until[index] <= now]
+
+    def mark_down(self, index: int, reason: str):
+        self._down_until[index] = time.monotonic() + REPLICA_RETRY_AFTER
+        logger.warning('read replica %s is out of rotation: %s', self.engines[index].url.host, reason)
+
+    async def session(self):
+        # соединение берется сразу: недоступная реплика отсеивается до того, как handler начнет запросы.
+        # Поэтому get_read_db только у эндпоинтов без кеша — они всегда идут в базу
+        for index in self._candidates():
+            db = self._sessions[index]()
+            try:
+                await db.connection()
+            except (DBAPIError, PoolTimeoutError, OSError, asyncio.TimeoutError) as exc:
+                await db.close()
+                self.failovers += 1
+                self.mark_down(index, repr(exc))
+                continue
+            return db
+        return None
+
+    async def check(self):
+        for index, engine in enumerate(self.engines):
+            try:
+                async with engine.connect() as conn:
+                    lag = float(await conn.scalar(LAG_QUERY))
+            except (DBAPIError, PoolTimeoutError, OSError, asyncio.TimeoutError) as exc:
+                self._lag[index] = None
+                self.mark_down(index, repr(exc))
+                continue
+            self._lag[index] = lag
+            if lag > REPLICA_MAX_LAG:
+                self.mark_down(index, f'lag {lag:.1f}s')
+            else:
+                self._down_until[index] = 0.0
+
+    async def run_health_checks(self, interval: float = REPLICA_HEALTH_INTERVAL):
+        while True:
+            try:
+                await self.check()
+            except Exception:
+                logger.exception('replica health check failed')
+            await asyncio.sleep(interval)
+
+    def stats(self):
+        now = time.monotonic()
+        return {
+            'failovers': self.failovers,
+            'replicas': [{'host': engine.url.host, 'database': engine.url.database,
+                          'healthy': self._down_until[index] <= now, 'lag_seconds': self._lag[index]}
+                         for index, engine in enumerate(self.engines)],
+        }
+
+
+def prefers_primary(request) -> bool:
+    return PRIMARY_COOKIE in request.cookies or request.headers.get(PRIMARY_HEADER) == '1'
+
+
+class ReadYourWritesMiddleware:
+    # успешная запись ставит cookie: следующие GET этого клиента какое-то время читают с primary
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or scope['method'] in SAFE_METHODS:
+            return await self.app(scope, receive, send)
+
+        async def send_wrapper(message):
+            if message['type'] == 'http.response.start' and message['status'] < 400:
+                cookie = f'{PRIMARY_COOKIE}=1; Max-Age={READ_YOUR_WRITES_SECONDS}; Path=/; HttpOnly; SameSite=Lax'
+                message = {**message, 'headers': [*message.get('headers', []),
+                                                  (b'set-cookie', cookie.encode('latin-1'))]}
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
@@ -1,7 +1,18 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, AfterValidator
+from typing import Dict, Annotated
 from glovo_app.db.models import *
 
 
+def reject_null(value):
+    if value is None:
+        raise ValueError('must not be null')
+    return value
+
+
+# для PATCH: поле можно не передавать, но явный null в NOT NULL колонку — 422, а не 500 из базы
+NotNull = AfterValidator(reject_null)
+
+
 class UserProfileSchema(BaseModel):
     id: int
     first_name: str
@@ -21,9 +32,36 @@ class StoreSchema(BaseModel):
     store_name: str
     store_description: str
     address: str
-    store_image: str
+    store_image: Optional[str] = None
+    owner_id: int
+    category_id: int
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+
+
+# в списках без описания: Text тянется только в detail
+class StoreListSchema(BaseModel):
+    id: int
+    store_name: str
+    address: str
+    store_image: Optional[str] = None
     owner_id: int
     category_id: int
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+
+
+# имена полей как в StoreSchema
+class StorePatchSchema(BaseModel):
+    store_name: Annotated[Optional[str], NotNull] = None
+    store_image: Optional[str] = None
+    store_description: Annotated[Optional[str], NotNull] = None
+    address: Annotated[Optional[str], NotNull] = None
+    category_id: Annotated[Optional[int], NotNull] = None
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+    delivery_radius_km: Annotated[Optional[float], NotNull] = None
+    is_open: Annotated[Optional[bool], NotNull] = None
 
 
 class ContactSchema(BaseModel):
@@ -36,8 +74,17 @@ class ProductSchema(BaseModel):
     id: int
     product_name: str
     product_description: str
-    price: int
-    product_image: str
+    # DECIMAL(8, 2); export пишет его числом, import принимает и строку "12.50"
+    price: float
+    product_image: Optional[str] = None
+    store_id: int
+
+
+class ProductListSchema(BaseModel):
+    id: int
+    product_name: str
+    price: float
+    product_image: Optional[str] = None
     store_id: int
 
 
@@ -45,18 +92,39 @@ class ProductComboSchema(BaseModel):
     id: int
     product_name: str
     description: str
-    price: int
-    image: str
+    price: float
+    image: Optional[str] = None
+    store_id: int
+
+
+class ProductComboListSchema(BaseModel):
+    id: int
+    product_name: str
+    price: float
+    image: Optional[str] = None
     store_id: int
 
 
 class OrderSchema(BaseModel):
     id: int
     delivery_address: str
-    created_date: datetime
+    # ставит сервер при создании, из запроса не берется
+    created_date: Optional[datetime] = None
     role: OrderStatus
-    client_id: int
-    courier_id: int
+    # колонки client_id в orders нет: принимается, но не сохраняется
+    client_id: Optional[int] = None
+    # назначает dispatch, до этого None
+    courier_id: Optional[int] = None
+    delivery_latitude: Optional[float] = None
+    delivery_longitude: Optional[float] = None
+
+
+class OrderPatchSchema(BaseModel):
+    role: Annotated[Optional[OrderStatus], NotNull] = None
+    delivery_address: Annotated[Optional[str], NotNull] = None
+    delivery_latitude: Optional[float] = None
+    delivery_longitude: Optional[float] = None
+    courier_id: Optional[int] = None
 
 
 class CourierSchema(BaseModel):
@@ -65,33 +133,109 @@ class CourierSchema(BaseModel):
     order_id: int
 
 
+class CourierLocationSchema(BaseModel):
+    latitude: float
+    longitude: float
+
+
 class StoreReviewSchema(BaseModel):
     store_id: int
     client_id: int
-    created_date: datetime
+    # ставит сервер при создании, из запроса не берется
+    created_date: Optional[datetime] = None
     comment: str
     rating: RatingStatus
 
 
 class CourierReviewSchema(BaseModel):
     courier_id: int
-    client_id: int
-    created_date: datetime
+    # в courier_review нет колонки client_id: принимается, но не сохраняется, в ответах None
+    client_id: Optional[int] = None
+    # ставит сервер при создании, из запроса не берется
+    created_date: Optional[datetime] = None
     comment: str
     rating: RatingStatus
 
 
+class OrderTransitionSchema(BaseModel):
+    role: OrderStatus
+    # когда статус сменился на самом деле: приложение курьера может отправить обновления позже
+    occurred_at: Optional[datetime] = None
+
+
+class OrderBatchTransitionSchema(OrderTransitionSchema):
+    order_id: int
+    version: Optional[int] = None
 
 
+class OrderTransitionResultSchema(BaseModel):
+    order_id: int
+    role: OrderStatus
+    version: int
 
 
+class OrderEventSchema(BaseModel):
+    from_status: Optional[OrderStatus] = None
+    to_status: OrderStatus
+    created_date: datetime
 
 
+class RatingSummarySchema(BaseModel):
+    review_count: int
+    avg_rating: Optional[float] = None
+    histogram: Dict[str, int]
 
 
+class MenuContactSchema(BaseModel):
+    id: int
+    contact_number: Optional[str] = None
 
 
+class MenuProductSchema(BaseModel):
+    id: int
+    product_name: str
+    product_image: Optional[str] = None
+    price: float
+    description: str
 
 
+class MenuComboSchema(BaseModel):
+    id: int
+    combo_name: str
+    combo_image: Optional[str] = None
+    price: float
+    description: str
 
 
+class StoreMenuSchema(BaseModel):
+    id: int
+    store_name: str
+    store_image: Optional[str] = None
+    description: str
+    address: str
+    user_id: int
+    category_id: int
+    avg_rating: Optional[float] = None
+    review_count: int
+    contacts: List[MenuContactSchema]
+    products: List[MenuProductSchema]
+    combos: List[MenuComboSchema]
+
+
+class SearchResultSchema(BaseModel):
+    kind: str
+    id: int
+    name: str
+    store_id: int
+    score: float
+
+
+class NearbyStoreSchema(BaseModel):
+    id: int
+    store_name: str
+    store_image: Optional[str] = None
+    address: str
+    category_id: int
+    latitude: float
+    longitude: float
+    distance_km: float
@@ -0,0 +1,39 @@
+import re
+
+from sqlalchemy import select, func, literal, literal_column, union_all, or_
+
+from glovo_app.db.models import Store, Product, ProductCombo
+
+# выражения должны совпадать с индексами из миграции 8b1e4c6d2f90, иначе Postgres их не использует
+STORE_VECTOR = "to_tsvector('simple', coalesce(store_name, '') || ' ' || coalesce(description, ''))"
+PRODUCT_VECTOR = "to_tsvector('simple', coalesce(product_name, '') || ' ' || coalesce(description, ''))"
+COMBO_VECTOR = "to_tsvector('simple', coalesce(combo_name, '') || ' ' || coalesce(description, ''))"
+
+
+def prefix_tsquery(text: str) -> str:
+    # каждое слово ищем как префикс: "пиц марг" -> "пиц:* & марг:*"
+    return ' & '.join(f'{word}:*' for word in re.findall(r'\w+', text.lower()))
+
+
+def _branch(kind: str, model, name_column, store_column, vector_sql: str, ts_query, text: str):
+    vector = literal_column(vector_sql)
+    score = func.ts_rank_cd(vector, ts_query) + func.similarity(name_column, text)
+    return (select(literal(kind).label('kind'), model.id.label('id'), name_column.label('name'),
+                   store_column.label('store_id'), score.label('score'))
+            .where(or_(vector.op('@@')(ts_query), name_column.op('%')(text))))
+
+
+def search_query(text: str, kinds, limit: int, offset: int):
+    ts_query = func.to_tsquery('simple', prefix_tsquery(text))
+    branches = {
+        'store': lambda: _branch('store', Store, Store.store_name, Store.id, STORE_VECTOR, ts_query, text),
+        'product': lambda: _branch('product', Product, Product.product_name, Product.store_id,
+                                   PRODUCT_VECTOR, ts_query, text),
+        'combo': lambda: _branch('combo', ProductCombo, ProductCombo.combo_name, ProductCombo.store_id,
+                                 COMBO_VECTOR, ts_query, text),
+    }
+    results = union_all(*(branches[kind]() for kind in kinds)).subquery()
+    return (select(results)
+            .order_by(results.c.score.desc(), results.c.kind, results.c.id)
+            .limit(limit)
+            .offset(offset))
@@ -0,0 +1,49 @@
+from typing import Optional
+
+from fastapi import HTTPException, Response, status
+from sqlalchemy import select, update
+
+
+def etag(version: int) -> str:
+    return f'"{version}"'
+
+
+def set_etag(response: Response, version: int):
+    response.headers['ETag'] = etag(version)
+
+
+def parse_if_match(if_match: Optional[str]) -> Optional[int]:
+    if if_match is None or if_match.strip() == '*':
+        return None
+    value = if_match.strip()
+    if value.startswith('W/'):
+        value = value[2:]
+    try:
+        return int(value.strip('"'))
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_412_PRECONDITION_FAILED, detail='invalid If-Match')
+
+
+def version_conflict():
+    return HTTPException(status_code=status.HTTP_412_PRECONDITION_FAILED, detail='version conflict')
+
+
+def check_version(current_version: int, expected_version: Optional[int]):
+    if expected_version is not None and current_version != expected_version:
+        raise version_conflict()
+
+
+async def versioned_update(db, model, object_id: int, values: dict, expected_version: Optional[int]):
+    # один UPDATE ... WHERE id AND version RETURNING без предварительного SELECT и без блокировок
+    stmt = update(model).where(model.id == object_id)
+    if expected_version is not None:
+        stmt = stmt.where(model.version == expected_version)
+    stmt = (stmt.values(**values, version=model.version + 1)
+            .returning(model)
+            .execution_options(synchronize_session=False, populate_existing=True))
+    obj = await db.scalar(stmt)
+    if obj is None:
+        if await db.scalar(select(model.id).where(model.id == object_id)) is None:
+            return None
+        raise version_conflict()
+    return obj
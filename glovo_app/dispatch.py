@@ -0,0 +1,121 @@
+import asyncio
+import logging
+
+import numpy as np
+from sqlalchemy import select, update, insert, bindparam
+
+from glovo_app.config import DISPATCH_INTERVAL, DISPATCH_BATCH_SIZE, DISPATCH_MAX_DISTANCE_KM
+from glovo_app.db.database import AsyncSessionLocal
+from glovo_app.db.geo import EARTH_RADIUS_KM
+from glovo_app.db.models import Order, OrderStatus, OrderEvent, Courier, CourierStatus
+from glovo_app.db.order_states import event_row
+from glovo_app.order_events import publish_order_status
+
+try:
+    from scipy.optimize import linear_sum_assignment
+except ImportError:
+    linear_sum_assignment = None
+
+logger = logging.getLogger(__name__)
+
+
+def distance_matrix(order_coords: np.ndarray, courier_coords: np.ndarray) -> np.ndarray:
+    # haversine сразу для всех пар: (orders, 2) x (couriers, 2) -> (orders, couriers)
+    order_rad = np.radians(order_coords)[:, None, :]
+    courier_rad = np.radians(courier_coords)[None, :, :]
+    d_lat = (courier_rad[..., 0] - order_rad[..., 0]) / 2
+    d_lon = (courier_rad[..., 1] - order_rad[..., 1]) / 2
+    a = np.sin(d_lat) ** 2 + np.cos(order_rad[..., 0]) * np.cos(courier_rad[..., 0]) * np.sin(d_lon) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def greedy_match(distances: np.ndarray, max_km: float):
+    pairs = []
+    used_orders = set()
+    used_couriers = set()
+    flat = np.argsort(distances, axis=None)
+    for order_index, courier_index in zip(*np.unravel_index(flat, distances.shape)):
+        if distances[order_index, courier_index] > max_km:
+            break
+        if order_index in used_orders or courier_index in used_couriers:
+            continue
+        pairs.append((int(order_index), int(courier_index)))
+        used_orders.add(order_index)
+        used_couriers.add(courier_index)
+        if len(used_orders) == distances.shape[0] or len(used_couriers) == distances.shape[1]:
+            break
+    return pairs
+
+
+def optimal_match(distances: np.ndarray, max_km: float):
+    # пары дальше max_km штрафуем и потом выбрасываем
+    cost = np.where(distances > max_km, max_km * 1000, distances)
+    rows, cols = linear_sum_assignment(cost)
+    return [(int(row), int(col)) for row, col in zip(rows, cols) if distances[row, col] <= max_km]
+
+
+def match(order_coords, courier_coords, max_km: float = DISPATCH_MAX_DISTANCE_KM, method: str = 'auto'):
+    if len(order_coords) == 0 or len(courier_coords) == 0:
+        return []
+    distances = distance_matrix(np.asarray(order_coords, dtype=float), np.asarray(courier_coords, dtype=float))
+    if method == 'optimal' or (method == 'auto' and linear_sum_assignment is not None):
+        return optimal_match(distances, max_km)
+    return greedy_match(distances, max_km)
+
+
+async def dispatch_once(batch_size: int = DISPATCH_BATCH_SIZE) -> int:
+    async with AsyncSessionLocal() as db:
+        async with db.begin():
+            # SKIP LOCKED: параллельные воркеры берут разные строки и не ждут друг друга
+            orders = (await db.execute(
+                select(Order.id, Order.delivery_latitude, Order.delivery_longitude)
+                .where(Order.role == OrderStatus.tim1, Order.courier_id.is_(None),
+                       Order.delivery_latitude.is_not(None), Order.delivery_longitude.is_not(None))
+                .order_by(Order.created_date)
+                .limit(batch_size)
+                .with_for_update(skip_locked=True))).all()
+            if not orders:
+                return 0
+            couriers = (await db.execute(
+                select(Courier.id, Courier.courier_id, Courier.latitude, Courier.longitude)
+                .where(Courier.status_courier == CourierStatus.cour1,
+                       Courier.latitude.is_not(None), Courier.longitude.is_not(None))
+                .limit(batch_size)
+                .with_for_update(skip_locked=True))).all()
+            if not couriers:
+                return 0
+
+            pairs = match([(order.delivery_latitude, order.delivery_longitude) for order in orders],
+                          [(courier.latitude, courier.longitude) for courier in couriers])
+            if not pairs:
+                return 0
+            # Core-таблица: executemany одним UPDATE и version + 1, чтобы ETag клиентов устарел
+            order_table = Order.__table__
+            await db.execute(update(order_table)
+                             .where(order_table.c.id == bindparam('b_id'))
+                             .values(courier_id=bindparam('b_courier_id'), role=OrderStatus.tim2,
+                                     version=order_table.c.version + 1), [
+                {'b_id': orders[order_index].id, 'b_courier_id': couriers[courier_index].courier_id}
+                for order_index, courier_index in pairs
+            ])
+            await db.execute(insert(OrderEvent), [
+                event_row(orders[order_index].id, OrderStatus.tim1, OrderStatus.tim2) for order_index, _ in pairs
+            ])
+            await db.execute(update(Courier), [
+                {'id': couriers[courier_index].id, 'status_courier': CourierStatus.cour2}
+                for _, courier_index in pairs
+            ])
+    for order_index, _ in pairs:
+        await publish_order_status(orders[order_index].id, OrderStatus.tim2)
+    return len(pairs)
+
+
+async def run_dispatcher(interval: float = DISPATCH_INTERVAL):
+    while True:
+        try:
+            assigned = await dispatch_once()
+            if assigned:
+                logger.info('dispatched %s orders', assigned)
+        except Exception:
+            logger.exception('dispatch failed')
+        await asyncio.sleep(interval)
@@ -0,0 +1,55 @@
+import json
+from decimal import Decimal
+from functools import lru_cache
+from typing import List
+
+from fastapi import Response
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _default(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content) -> bytes:
+        if orjson is None:
+            return json.dumps(content, default=_default, ensure_ascii=False, separators=(',', ':')).encode()
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+@lru_cache(maxsize=None)
+def _list_adapter(schema):
+    return TypeAdapter(List[schema])
+
+
+def projection(schema, model, **columns) -> list:
+    # колонки под именами полей схемы; где имя поля не совпадает с колонкой — передать явно
+    selected = []
+    for name in schema.model_fields:
+        column = columns.get(name, getattr(model, name, None))
+        if column is None:
+            raise ValueError(f'{model.__name__} has no column for {schema.__name__}.{name}')
+        selected.append(column.label(name))
+    return selected
+
+
+def list_responses(schema) -> dict:
+    # для роутов, которые сами отдают fast_list_response: response_model там не применялся бы,
+    # схема нужна только для OpenAPI
+    return {200: {'model': List[schema]}}
+
+
+def fast_list_response(schema, rows, response: Response) -> FastJSONResponse:
+    # схема один раз валидирует строки (Row или dict из кеша), ответ уходит мимо jsonable_encoder
+    adapter = _list_adapter(schema)
+    items = adapter.dump_python(adapter.validate_python(rows, from_attributes=True))
+    return FastJSONResponse(items, headers=dict(response.headers))
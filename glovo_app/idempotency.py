@@ -0,0 +1,102 @@
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from typing import Optional
+
+from fastapi import Header, HTTPException, Response, status
+from fastapi.encoders import jsonable_encoder
+from redis.exceptions import RedisError
+from sqlalchemy import inspect
+
+from glovo_app import cache
+from glovo_app.config import IDEMPOTENCY_TTL, IDEMPOTENCY_WAIT, IDEMPOTENCY_PENDING_TTL
+
+logger = logging.getLogger(__name__)
+
+REPLAY_HEADER = 'Idempotent-Replayed'
+
+
+def idempotency_key(key: Optional[str] = Header(None, alias='Idempotency-Key', max_length=255)) -> Optional[str]:
+    return key
+
+
+def _fingerprint(payload) -> str:
+    raw = json.dumps(jsonable_encoder(payload), sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def _to_body(result):
+    if isinstance(result, Response):
+        return json.loads(result.body)
+    if inspect(result, raiseerr=False) is not None:
+        return cache.row_to_dict(result)
+    return jsonable_encoder(result)
+
+
+def _replay(stored: dict, fingerprint: str, response: Response):
+    if stored['fingerprint'] != fingerprint:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                            detail='Idempotency-Key already used with another payload')
+    response.headers[REPLAY_HEADER] = 'true'
+    return stored['body']
+
+
+async def _release(redis_key: str):
+    try:
+        await cache.redis_client.delete(redis_key)
+    except RedisError:
+        logger.warning('idempotency release failed for %s', redis_key, exc_info=True)
+
+
+async def idempotent(scope: str, key: Optional[str], payload, response: Response, create):
+    # повтор с тем же ключом получает сохраненный ответ и не трогает Postgres;
+    # параллельный дубликат ждет, пока первый запрос допишет ответ
+    if key is None or cache.redis_client is None:
+        return await create()
+    redis_key = f'idempotency:{scope}:{key}'
+    fingerprint = _fingerprint(payload)
+    try:
+        claimed = await cache.redis_client.set(redis_key, json.dumps({'state': 'pending', 'fingerprint': fingerprint}),
+                                               nx=True, ex=IDEMPOTENCY_PENDING_TTL)
+        if not claimed:
+            deadline = time.monotonic() + IDEMPOTENCY_WAIT
+            while True:
+                raw = await cache.redis_client.get(redis_key)
+                if raw is None:
+                    break
+                stored = json.loads(raw)
+                if stored['state'] == 'done':
+                    return _replay(stored, fingerprint, response)
+                if stored['fingerprint'] != fingerprint:
+                    return _replay(stored, fingerprint, response)
+                if time.monotonic() >= deadline:
+                    raise HTTPException(status_code=status.HTTP_409_CONFLICT,
+                                        detail='request with this Idempotency-Key is in progress')
+                await asyncio.sleep(0.05)
+            # первый запрос упал и снял ключ — выполняем сами
+            return await idempotent(scope, key, payload, response, create)
+    except RedisError:
+        logger.warning('idempotency lookup failed for %s', redis_key, exc_info=True)
+        return await create()
+
+    try:
+        result = await create()
+    except BaseException:
+        await _release(redis_key)
+        raise
+    status_code = result.status_code if isinstance(result, Response) else response.status_code or 200
+    if not 200 <= status_code < 300:
+        # ошибку не запоминаем: повтор с тем же ключом выполнится заново
+        await _release(redis_key)
+        return result
+    # полный TTL только у готового ответа
+    try:
+        await cache.redis_client.set(redis_key, json.dumps({'state': 'done', 'fingerprint': fingerprint,
+                                                            'body': _to_body(result)}), ex=IDEMPOTENCY_TTL)
+    except RedisError:
+        logger.warning('idempotency store failed for %s', redis_key, exc_info=True)
+        # иначе повторы ждали бы pending до конца его TTL
+        await _release(redis_key)
+    return result
@@ -1,3 +1,4 @@
+import asyncio
 import fastapi
 import redis.asyncio as redis
 import uvicorn
@@ -7,24 +8,47 @@ from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from admin.setup import setup_admin
 from api.endpoints import (auth, categories, courier_reviews, couriers, orders, products, product_comdos,
-                           store_reviews, stores, social_auth)
+                           store_reviews, stores, social_auth, monitoring, search)
 from starlette.middleware.sessions import SessionMiddleware
-from glovo_app.config import SECRET_KEY
+from glovo_app.config import SECRET_KEY, REDIS_URL, DISPATCH_ENABLED
+from glovo_app.cache import init_cache
+from glovo_app import password_pool
+from glovo_app.refresh_tokens import run_sweeper
+from glovo_app.dispatch import run_dispatcher
+from glovo_app.db.partitions import run_partition_maintainer
+from glovo_app.order_events import order_status_hub
+from glovo_app.request_metrics import MetricsMiddleware
+from glovo_app.db.database import replica_router
+from glovo_app.db.replicas import ReadYourWritesMiddleware
 
 async def init_redis():
-    return redis.Redis.from_url("redis://localhost", encoding="utf-8", decode_responses=True)
+    return redis.Redis.from_url(REDIS_URL, encoding="utf-8", decode_responses=True)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     redis = await init_redis()
     await FastAPILimiter.init(redis)
+    init_cache(redis)
+    await order_status_hub.start(redis)
+    tasks = [asyncio.create_task(run_sweeper()), asyncio.create_task(run_partition_maintainer())]
+    if DISPATCH_ENABLED:
+        tasks.append(asyncio.create_task(run_dispatcher()))
+    if replica_router is not None:
+        tasks.append(asyncio.create_task(replica_router.run_health_checks()))
     yield
+    for task in tasks:
+        task.cancel()
+    await order_status_hub.stop()
+    init_cache(None)
     await redis.close()
+    password_pool.shutdown()
 
 
 glovo_app = fastapi.FastAPI(title='glovo_site', lifespan=lifespan)
 glovo_app.add_middleware(SessionMiddleware, secret_key="SECRET_KEY")
+glovo_app.add_middleware(MetricsMiddleware)
+glovo_app.add_middleware(ReadYourWritesMiddleware)
 setup_admin(glovo_app)
 
 glovo_app.include_router(auth.auth_router, tags=['Auth'])
@@ -37,6 +61,9 @@ glovo_app.include_router(products.product_router, tags=['Products'])
 glovo_app.include_router(stores.stores_router, tags=['Stores'])
 glovo_app.include_router(store_reviews.store_review_router, tags=['Store_reviews'])
 glovo_app.include_router(social_auth.social_router, tags=['social'])
+glovo_app.include_router(search.search_router, tags=['Search'])
+glovo_app.include_router(monitoring.monitoring_router, tags=['Monitoring'])
+glovo_app.include_router(monitoring.metrics_router, tags=['Monitoring'])
 
 if __name__ == '__main__':
     uvicorn.run(glovo_app, host='127.0.0.1', port=8080)
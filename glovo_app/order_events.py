@@ -0,0 +1,98 @@
+import asyncio
+import json
+import logging
+from collections import defaultdict
+from contextlib import asynccontextmanager
+
+from redis.exceptions import RedisError
+
+from glovo_app import cache
+
+logger = logging.getLogger(__name__)
+
+CHANNEL_PREFIX = 'order_status:'
+# канал-заглушка держит pubsub-соединение открытым, пока нет ни одной подписки
+IDLE_CHANNEL = CHANNEL_PREFIX + 'idle'
+
+
+def order_channel(order_id: int) -> str:
+    return f'{CHANNEL_PREFIX}{order_id}'
+
+
+async def publish_order_status(order_id: int, role):
+    if cache.redis_client is None:
+        return
+    message = json.dumps({'order_id': order_id, 'role': getattr(role, 'value', role)}, ensure_ascii=False)
+    try:
+        await cache.redis_client.publish(order_channel(order_id), message)
+    except RedisError:
+        logger.warning('publish failed for order %s', order_id, exc_info=True)
+
+
+class OrderStatusHub:
+    # одно pubsub-соединение на воркер, сообщения раздаются локальным очередям
+    def __init__(self):
+        self._pubsub = None
+        self._reader = None
+        self._subscribers = defaultdict(set)
+        self._lock = asyncio.Lock()
+
+    async def start(self, client):
+        self._pubsub = client.pubsub()
+        await self._pubsub.subscribe(IDLE_CHANNEL)
+        self._reader = asyncio.create_task(self._read())
+
+    async def stop(self):
+        if self._reader is not None:
+            self._reader.cancel()
+        if self._pubsub is not None:
+            await self._pubsub.close()
+        self._pubsub = None
+
+    async def _read(self):
+        while True:
+            try:
+                async for message in self._pubsub.listen():
+                    if message['type'] != 'message':
+                        continue
+                    event = json.loads(message['data'])
+                    for queue in list(self._subscribers.get(message['channel'], ())):
+                        if queue.full():
+                            # медленному клиенту важен только последний статус
+                            queue.get_nowait()
+                        queue.put_nowait(event)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception('order status reader failed, reconnecting')
+                await asyncio.sleep(1)
+
+    @asynccontextmanager
+    async def subscription(self, order_id: int):
+        if self._pubsub is None:
+            raise RuntimeError('order status hub is not started')
+        channel = order_channel(order_id)
+        queue = asyncio.Queue(maxsize=100)
+        async with self._lock:
+            if not self._subscribers[channel]:
+                await self._pubsub.subscribe(channel)
+            self._subscribers[channel].add(queue)
+        try:
+            yield queue
+        finally:
+            async with self._lock:
+                self._subscribers[channel].discard(queue)
+                if not self._subscribers[channel]:
+                    del self._subscribers[channel]
+                    if self._pubsub is not None:
+                        try:
+                            await self._pubsub.unsubscribe(channel)
+                        except RedisError:
+                            logger.warning('unsubscribe failed for %s', channel, exc_info=True)
+
+    def stats(self):
+        return {'channels': len(self._subscribers),
+                'subscribers': sum(len(queues) for queues in self._subscribers.values())}
+
+
+order_status_hub = OrderStatusHub()
@@ -0,0 +1,40 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi import HTTPException, status
+
+from glovo_app.config import PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_QUEUE
+
+_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix='password-hash')
+_semaphore = asyncio.Semaphore(PASSWORD_HASH_WORKERS)
+
+stats = {
+    'workers': PASSWORD_HASH_WORKERS,
+    'max_queue': PASSWORD_HASH_MAX_QUEUE,
+    'running': 0,
+    'queued': 0,
+    'completed': 0,
+    'rejected': 0,
+}
+
+
+async def run_hashing(func, *args):
+    if stats['queued'] >= PASSWORD_HASH_MAX_QUEUE:
+        stats['rejected'] += 1
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail='Кийинчерээк кайталаңыз')
+    stats['queued'] += 1
+    try:
+        await _semaphore.acquire()
+    finally:
+        stats['queued'] -= 1
+    stats['running'] += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_executor, func, *args)
+    finally:
+        stats['running'] -= 1
+        stats['completed'] += 1
+        _semaphore.release()
+
+
+def shutdown():
+    _executor.shutdown(wait=False, cancel_futures=True)
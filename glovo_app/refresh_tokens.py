@@ -0,0 +1,72 @@
+import asyncio
+import hashlib
+import logging
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, delete
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from glovo_app.config import (REFRESH_TOKEN_EXPIRE_DAYS, REFRESH_TOKENS_PER_USER, REFRESH_TOKEN_SWEEP_INTERVAL,
+                              REFRESH_TOKEN_SWEEP_BATCH)
+from glovo_app.db.database import AsyncSessionLocal
+from glovo_app.db.models import RefreshToken
+
+logger = logging.getLogger(__name__)
+
+
+def token_digest(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+async def consume_refresh_token(db: AsyncSession, token: str):
+    # DELETE ... RETURNING: из двух параллельных запросов с одним токеном его получит только один
+    result = await db.execute(delete(RefreshToken)
+                              .where(RefreshToken.token_hash == token_digest(token))
+                              .returning(RefreshToken.user_id))
+    return result.scalar()
+
+
+async def store_refresh_token(db: AsyncSession, user_id: int, token: str):
+    # оставляем только последние REFRESH_TOKENS_PER_USER - 1 токенов, новый станет последним
+    keep = (select(RefreshToken.id)
+            .where(RefreshToken.user_id == user_id)
+            .order_by(RefreshToken.created_date.desc(), RefreshToken.id.desc())
+            .limit(REFRESH_TOKENS_PER_USER - 1))
+    await db.execute(delete(RefreshToken)
+                     .where(RefreshToken.user_id == user_id, RefreshToken.id.not_in(keep))
+                     .execution_options(synchronize_session=False))
+    db.add(RefreshToken(token_hash=token_digest(token), user_id=user_id))
+
+
+async def revoke_user_tokens(db: AsyncSession, user_id: int):
+    await db.execute(delete(RefreshToken)
+                     .where(RefreshToken.user_id == user_id)
+                     .execution_options(synchronize_session=False))
+
+
+async def sweep_expired_tokens(batch_size: int = REFRESH_TOKEN_SWEEP_BATCH) -> int:
+    cutoff = datetime.utcnow() - timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+    total = 0
+    while True:
+        async with AsyncSessionLocal() as db:
+            batch = (select(RefreshToken.id)
+                     .where(RefreshToken.created_date < cutoff)
+                     .limit(batch_size))
+            result = await db.execute(delete(RefreshToken)
+                                      .where(RefreshToken.id.in_(batch))
+                                      .execution_options(synchronize_session=False))
+            await db.commit()
+        total += result.rowcount
+        if result.rowcount < batch_size:
+            return total
+
+
+async def run_sweeper(interval: int = REFRESH_TOKEN_SWEEP_INTERVAL):
+    while True:
+        try:
+            deleted = await sweep_expired_tokens()
+            if deleted:
+                logger.info('deleted %s expired refresh tokens', deleted)
+        except Exception:
+            logger.exception('refresh token sweep failed')
+        await asyncio.sleep(interval)
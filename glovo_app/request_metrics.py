@@ -0,0 +1,158 @@
+import contextvars
+import logging
+import threading
+import time
+
+from sqlalchemy import event
+
+from glovo_app.config import SLOW_QUERY_MS
+from glovo_app.db.pool_metrics import WaitHistogram
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+DB_TIME_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 5000)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+UNMATCHED_ROUTE = '<unmatched>'
+
+
+class RequestStats:
+    __slots__ = ('queries', 'db_ms')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_ms = 0.0
+
+
+# у каждого запроса свой счетчик; greenlet из sqlalchemy.asyncio наследует контекст
+_current = contextvars.ContextVar('request_stats', default=None)
+
+
+class RouteMetrics:
+    def __init__(self):
+        self.latency = WaitHistogram(LATENCY_BUCKETS_MS)
+        self.queries = WaitHistogram(QUERY_COUNT_BUCKETS)
+        self.db_time = WaitHistogram(DB_TIME_BUCKETS_MS)
+        self.size = WaitHistogram(SIZE_BUCKETS)
+        self.statuses = {}
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.routes = {}
+        self.slow_queries = 0
+        self._lock = threading.Lock()
+
+    def route(self, method: str, path: str) -> RouteMetrics:
+        key = (method, path)
+        metrics = self.routes.get(key)
+        if metrics is None:
+            with self._lock:
+                metrics = self.routes.setdefault(key, RouteMetrics())
+        return metrics
+
+    def observe(self, method, path, status, latency_ms, stats: RequestStats, size):
+        metrics = self.route(method, path)
+        metrics.latency.observe(latency_ms)
+        metrics.queries.observe(stats.queries)
+        metrics.db_time.observe(stats.db_ms)
+        metrics.size.observe(size)
+        with self._lock:
+            metrics.statuses[status] = metrics.statuses.get(status, 0) + 1
+
+    def render(self) -> str:
+        lines = []
+        histograms = (
+            ('glovo_http_request_duration_ms', 'Request latency in milliseconds', 'latency'),
+            ('glovo_http_request_db_queries', 'SQL statements executed per request', 'queries'),
+            ('glovo_http_request_db_time_ms', 'Time spent in SQL per request in milliseconds', 'db_time'),
+            ('glovo_http_response_size_bytes', 'Response body size in bytes', 'size'),
+        )
+        routes = sorted(self.routes.items())
+        for name, help_text, attr in histograms:
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} histogram')
+            for (method, path), metrics in routes:
+                labels = f'method="{method}",route="{_escape(path)}"'
+                snapshot = getattr(metrics, attr).snapshot()
+                for bound, count in snapshot['buckets'].items():
+                    lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {count}')
+                lines.append(f'{name}_sum{{{labels}}} {snapshot["sum_ms"]}')
+                lines.append(f'{name}_count{{{labels}}} {snapshot["count"]}')
+        lines.append('# HELP glovo_http_requests_total Requests by route and status code')
+        lines.append('# TYPE glovo_http_requests_total counter')
+        for (method, path), metrics in routes:
+            for status, count in sorted(metrics.statuses.items()):
+                lines.append(f'glovo_http_requests_total{{method="{method}",route="{_escape(path)}",'
+                             f'status="{status}"}} {count}')
+        lines.append('# HELP glovo_db_slow_queries_total SQL statements slower than SLOW_QUERY_MS')
+        lines.append('# TYPE glovo_db_slow_queries_total counter')
+        lines.append(f'glovo_db_slow_queries_total {self.slow_queries}')
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"')
+
+
+registry = MetricsRegistry()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed_ms = (time.perf_counter() - conn.info['query_start'].pop()) * 1000
+    stats = _current.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.db_ms += elapsed_ms
+    if elapsed_ms >= SLOW_QUERY_MS:
+        registry.slow_queries += 1
+        logger.warning('slow query %.1f ms: %s', elapsed_ms, ' '.join(statement.split())[:1000])
+
+
+def _handle_error(exception_context):
+    starts = exception_context.connection.info.get('query_start') if exception_context.connection else None
+    if starts:
+        starts.pop()
+
+
+def instrument_engine(engine):
+    event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+    event.listen(engine, 'handle_error', _handle_error)
+
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+        stats = RequestStats()
+        token = _current.set(stats)
+        status = 500
+        size = 0
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status, size
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            elif message['type'] == 'http.response.body':
+                size += len(message.get('body', b''))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            # шаблон пути, а не сам путь, иначе /store/1/, /store/2/ ... раздуют метрики
+            route = scope.get('route')
+            path = getattr(route, 'path', UNMATCHED_ROUTE)
+            registry.observe(scope['method'], path, status, (time.perf_counter() - start) * 1000, stats, size)
@@ -0,0 +1,45 @@
+import time
+from collections import OrderedDict
+
+from glovo_app.config import AUTH_CACHE_SIZE, AUTH_CACHE_TTL
+
+
+class TokenCache:
+    # LRU: token -> (expires_at, user); запись живет не дольше токена и не дольше ttl
+    def __init__(self, max_size: int = AUTH_CACHE_SIZE, ttl: int = AUTH_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._items = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, token: str):
+        item = self._items.get(token)
+        if item is None:
+            self.misses += 1
+            return None
+        exp, user = item
+        if exp <= time.time():
+            del self._items[token]
+            self.misses += 1
+            return None
+        self._items.move_to_end(token)
+        self.hits += 1
+        return user
+
+    def set(self, token: str, exp: float, user):
+        self._items[token] = (min(exp, time.time() + self.ttl), user)
+        self._items.move_to_end(token)
+        while len(self._items) > self.max_size:
+            self._items.popitem(last=False)
+
+    def invalidate_user(self, user_id: int):
+        # все токены пользователя в этом воркере; остальные воркеры отпустят его по ttl
+        for token in [token for token, (_, user) in self._items.items() if user.id == user_id]:
+            del self._items[token]
+
+    def stats(self):
+        return {'size': len(self._items), 'max_size': self.max_size, 'hits': self.hits, 'misses': self.misses}
+
+
+token_cache = TokenCache()
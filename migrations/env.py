@@ -15,6 +15,9 @@ config = context.config
 if config.config_file_name is not None:
     fileConfig(config.config_file_name)
 
+# тот же URL что и у приложения (glovo_app/config.py), а не захардкоженный в alembic.ini
+config.set_main_option("sqlalchemy.url", DB_URL.replace("%", "%%"))
+
 # add your model's MetaData object here
 # for 'autogenerate' support
 # from myapp import mymodel
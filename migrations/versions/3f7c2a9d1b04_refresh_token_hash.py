@@ -0,0 +1,41 @@
+"""refresh token hash
+
+Revision ID: 3f7c2a9d1b04
+Revises: 5a2d11d0a961
+Create Date: 2026-10-18 10:12:41.503118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f7c2a9d1b04'
+down_revision: Union[str, None] = '5a2d11d0a961'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('refresh_token', sa.Column('token_hash', sa.String(length=64), nullable=True))
+    # уже выданные токены продолжают работать: считаем sha256 прямо в базе
+    op.execute("UPDATE refresh_token SET token_hash = encode(sha256(convert_to(token, 'UTF8')), 'hex')")
+    op.execute("DELETE FROM refresh_token a USING refresh_token b "
+               "WHERE a.token_hash = b.token_hash AND a.id < b.id")
+    op.alter_column('refresh_token', 'token_hash', nullable=False)
+    op.drop_column('refresh_token', 'token')
+    op.create_unique_constraint(op.f('uq_refresh_token_token_hash'), 'refresh_token', ['token_hash'])
+    op.create_index(op.f('ix_refresh_token_user_id'), 'refresh_token', ['user_id'], unique=False)
+    op.create_index(op.f('ix_refresh_token_created_date'), 'refresh_token', ['created_date'], unique=False)
+
+
+def downgrade() -> None:
+    # сами токены восстановить нельзя — все пользователи залогинятся заново
+    op.drop_index(op.f('ix_refresh_token_created_date'), table_name='refresh_token')
+    op.drop_index(op.f('ix_refresh_token_user_id'), table_name='refresh_token')
+    op.drop_constraint(op.f('uq_refresh_token_token_hash'), 'refresh_token', type_='unique')
+    op.execute("DELETE FROM refresh_token")
+    op.add_column('refresh_token', sa.Column('token', sa.String(), nullable=False))
+    op.drop_column('refresh_token', 'token_hash')
@@ -0,0 +1,39 @@
+"""search indexes
+
+Revision ID: 8b1e4c6d2f90
+Revises: 3f7c2a9d1b04
+Create Date: 2026-10-18 11:40:07.228415
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8b1e4c6d2f90'
+down_revision: Union[str, None] = '3f7c2a9d1b04'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# выражения совпадают с glovo_app/db/search.py
+SEARCH_INDEXES = [
+    ('ix_store_search', 'store', 'store_name'),
+    ('ix_products_search', 'products', 'product_name'),
+    ('ix_product_combo_search', 'product_combo', 'combo_name'),
+]
+
+
+def upgrade() -> None:
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for index_name, table, name_column in SEARCH_INDEXES:
+        op.execute(f"CREATE INDEX {index_name} ON {table} USING gin "
+                   f"(to_tsvector('simple', coalesce({name_column}, '') || ' ' || coalesce(description, '')))")
+        op.execute(f"CREATE INDEX {index_name}_trgm ON {table} USING gin ({name_column} gin_trgm_ops)")
+
+
+def downgrade() -> None:
+    for index_name, table, name_column in SEARCH_INDEXES:
+        op.drop_index(f'{index_name}_trgm', table_name=table)
+        op.drop_index(index_name, table_name=table)
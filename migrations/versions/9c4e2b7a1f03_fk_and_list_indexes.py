@@ -0,0 +1,50 @@
+"""fk and list indexes
+
+Revision ID: 9c4e2b7a1f03
+Revises: f58c0a2e4b17
+Create Date: 2026-10-18 15:31:07.204518
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9c4e2b7a1f03'
+down_revision: Union[str, None] = 'f58c0a2e4b17'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# совпадают с __table_args__ в glovo_app/db/models.py
+INDEXES = [
+    ('ix_store_category_id_id', 'store', ['category_id', 'id']),
+    ('ix_store_user_id_id', 'store', ['user_id', 'id']),
+    ('ix_contact_info_store_id', 'contact_info', ['store_id']),
+    ('ix_products_store_id_id', 'products', ['store_id', 'id']),
+    ('ix_product_combo_store_id_id', 'product_combo', ['store_id', 'id']),
+    ('ix_orders_role_created_date', 'orders', ['role', 'created_date', 'id']),
+    ('ix_orders_created_date', 'orders', ['created_date', 'id']),
+    ('ix_couriers_courier_id', 'couriers', ['courier_id']),
+    ('ix_couriers_status_courier_id', 'couriers', ['status_courier', 'id']),
+    ('ix_store_review_store_id_created_date', 'store_review', ['store_id', 'created_date', 'id']),
+    ('ix_store_review_created_date', 'store_review', ['created_date', 'id']),
+    ('ix_store_review_client_id', 'store_review', ['client_id']),
+    ('ix_courier_review_courier_id', 'courier_review', ['courier_id']),
+    ('ix_courier_review_created_date', 'courier_review', ['created_date', 'id']),
+]
+
+
+def upgrade() -> None:
+    # CONCURRENTLY не держит блокировку записи на больших таблицах, но не работает внутри транзакции
+    with op.get_context().autocommit_block():
+        for index_name, table, columns in INDEXES:
+            op.create_index(index_name, table, columns, unique=False, postgresql_concurrently=True,
+                            if_not_exists=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for index_name, table, columns in reversed(INDEXES):
+            op.drop_index(index_name, table_name=table, postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,48 @@
+"""cascade deletes
+
+Revision ID: b7d2f4a91c58
+Revises: 9c4e2b7a1f03
+Create Date: 2026-10-18 15:58:42.913076
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7d2f4a91c58'
+down_revision: Union[str, None] = '9c4e2b7a1f03'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# имена — дефолтные имена Postgres ({table}_{column}_fkey), с которыми создавались ключи
+FOREIGN_KEYS = [
+    ('refresh_token', 'user_id', 'user_profiles', 'CASCADE'),
+    ('store', 'user_id', 'user_profiles', 'CASCADE'),
+    ('store', 'category_id', 'category', 'CASCADE'),
+    ('contact_info', 'store_id', 'store', 'CASCADE'),
+    ('products', 'store_id', 'store', 'CASCADE'),
+    ('product_combo', 'store_id', 'store', 'CASCADE'),
+    ('couriers', 'courier_id', 'user_profiles', 'CASCADE'),
+    ('store_review', 'client_id', 'user_profiles', 'CASCADE'),
+    ('store_review', 'store_id', 'store', 'CASCADE'),
+    ('orders', 'courier_id', 'user_profiles', 'SET NULL'),
+    ('courier_review', 'courier_id', 'user_profiles', 'SET NULL'),
+]
+
+
+def recreate(ondelete_of):
+    for table, column, referent, ondelete in FOREIGN_KEYS:
+        name = f'{table}_{column}_fkey'
+        op.drop_constraint(name, table, type_='foreignkey')
+        op.create_foreign_key(name, table, referent, [column], ['id'], ondelete=ondelete_of(ondelete))
+
+
+def upgrade() -> None:
+    recreate(lambda ondelete: ondelete)
+
+
+def downgrade() -> None:
+    recreate(lambda ondelete: None)
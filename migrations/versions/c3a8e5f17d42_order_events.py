@@ -0,0 +1,44 @@
+"""order events
+
+Revision ID: c3a8e5f17d42
+Revises: b7d2f4a91c58
+Create Date: 2026-10-18 16:27:55.318204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3a8e5f17d42'
+down_revision: Union[str, None] = 'b7d2f4a91c58'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# тип orderstatus уже создан вместе с orders
+ORDER_STATUS = postgresql.ENUM('tim1', 'tim2', 'tim3', 'tim4', name='orderstatus', create_type=False)
+
+
+def upgrade() -> None:
+    op.create_table('order_events',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('order_id', sa.Integer(), nullable=False),
+    sa.Column('from_status', ORDER_STATUS, nullable=True),
+    sa.Column('to_status', ORDER_STATUS, nullable=False),
+    sa.Column('created_date', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['order_id'], ['orders.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_order_events_order_id_created_date', 'order_events', ['order_id', 'created_date'],
+                    unique=False)
+    # текущий статус существующих заказов — стартовое событие с датой создания
+    op.execute("INSERT INTO order_events (order_id, from_status, to_status, created_date) "
+               "SELECT id, NULL, role, created_date FROM orders")
+
+
+def downgrade() -> None:
+    op.drop_index('ix_order_events_order_id_created_date', table_name='order_events')
+    op.drop_table('order_events')
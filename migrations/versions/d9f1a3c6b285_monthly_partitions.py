@@ -0,0 +1,103 @@
+"""monthly partitions
+
+Requires downtime: every table is rebuilt under ACCESS EXCLUSIVE, so reads and
+writes to orders, store_review and courier_review block until the migration
+commits. Run it in a maintenance window with the app stopped.
+
+Revision ID: d9f1a3c6b285
+Revises: c3a8e5f17d42
+Create Date: 2026-10-18 17:04:12.551930
+
+"""
+from datetime import datetime
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from glovo_app.db.partitions import add_months, month_start, partition_ddl
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd9f1a3c6b285'
+down_revision: Union[str, None] = 'c3a8e5f17d42'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# партиции на столько месяцев вперед, дальше их создает glovo_app/db/partitions.py
+MONTHS_AHEAD = 3
+
+TABLES = {
+    'orders': {
+        'indexes': [('ix_orders_id', ['id']),
+                    ('ix_orders_courier_id', ['courier_id']),
+                    ('ix_orders_role_created_date', ['role', 'created_date', 'id']),
+                    ('ix_orders_created_date', ['created_date', 'id'])],
+        'foreign_keys': [('courier_id', 'user_profiles', 'SET NULL')],
+    },
+    'store_review': {
+        'indexes': [('ix_store_review_id', ['id']),
+                    ('ix_store_review_store_id_created_date', ['store_id', 'created_date', 'id']),
+                    ('ix_store_review_created_date', ['created_date', 'id']),
+                    ('ix_store_review_client_id', ['client_id'])],
+        'foreign_keys': [('client_id', 'user_profiles', 'CASCADE'), ('store_id', 'store', 'CASCADE')],
+    },
+    'courier_review': {
+        'indexes': [('ix_courier_review_id', ['id']),
+                    ('ix_courier_review_courier_id', ['courier_id']),
+                    ('ix_courier_review_created_date', ['created_date', 'id'])],
+        'foreign_keys': [('courier_id', 'user_profiles', 'SET NULL')],
+    },
+}
+
+
+def create_partitions(table, source):
+    first = op.get_bind().execute(sa.text(f'SELECT min(created_date) FROM {source}')).scalar() or datetime.utcnow()
+    month = month_start(first)
+    last = add_months(month_start(datetime.utcnow()), MONTHS_AHEAD)
+    while month <= last:
+        op.execute(partition_ddl(table, month))
+        month = add_months(month, 1)
+
+
+def rebuild(table, partitioned: bool):
+    # перекладка в новую таблицу под ACCESS EXCLUSIVE до конца миграции: ни одна запись не потеряется
+    # между копированием и DROP, но и чтение стоит — нужно окно обслуживания
+    spec = TABLES[table]
+    old_table = f'{table}_old'
+    bind = op.get_bind()
+    op.execute(f'LOCK TABLE {table} IN ACCESS EXCLUSIVE MODE')
+    sequence = bind.execute(sa.text('SELECT pg_get_serial_sequence(:table, :column)'),
+                            {'table': table, 'column': 'id'}).scalar()
+    op.execute(f'ALTER SEQUENCE {sequence} OWNED BY NONE')
+    op.execute(f'ALTER TABLE {table} RENAME TO {old_table}')
+    partition_by = ' PARTITION BY RANGE (created_date)' if partitioned else ''
+    op.execute(f'CREATE TABLE {table} (LIKE {old_table} INCLUDING DEFAULTS){partition_by}')
+    if partitioned:
+        create_partitions(table, old_table)
+    op.execute(f'INSERT INTO {table} SELECT * FROM {old_table}')
+    op.execute(f'DROP TABLE {old_table}')
+    # в партиционированной таблице ключ партиции обязан входить в первичный ключ
+    primary_key = ['id', 'created_date'] if partitioned else ['id']
+    op.create_primary_key(f'{table}_pkey', table, primary_key)
+    for index_name, columns in spec['indexes']:
+        op.create_index(index_name, table, columns, unique=False)
+    for column, referent, ondelete in spec['foreign_keys']:
+        op.create_foreign_key(f'{table}_{column}_fkey', table, referent, [column], ['id'], ondelete=ondelete)
+    op.execute(f'ALTER SEQUENCE {sequence} OWNED BY {table}.id')
+
+
+def upgrade() -> None:
+    # FK на orders(id) невозможен, когда ключ orders — (id, created_date)
+    op.drop_constraint('order_events_order_id_fkey', 'order_events', type_='foreignkey')
+    for table in TABLES:
+        rebuild(table, partitioned=True)
+
+
+def downgrade() -> None:
+    # отсоединенные архивом партиции обратно не возвращаются
+    for table in TABLES:
+        rebuild(table, partitioned=False)
+    op.execute('DELETE FROM order_events WHERE order_id NOT IN (SELECT id FROM orders)')
+    op.create_foreign_key('order_events_order_id_fkey', 'order_events', 'orders', ['order_id'], ['id'],
+                          ondelete='CASCADE')
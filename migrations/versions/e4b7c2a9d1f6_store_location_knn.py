@@ -0,0 +1,35 @@
+"""store location knn index
+
+Revision ID: e4b7c2a9d1f6
+Revises: d9f1a3c6b285
+Create Date: 2026-10-19 10:12:40.187362
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e4b7c2a9d1f6'
+down_revision: Union[str, None] = 'd9f1a3c6b285'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# выражение совпадает с planar_point в glovo_app/db/geo.py
+LOCATION = 'point(longitude * cos(radians(latitude)), latitude)'
+
+
+def upgrade() -> None:
+    # btree (latitude, longitude) сужал только полосу широт; GiST по точке дает KNN (ORDER BY <-> LIMIT)
+    with op.get_context().autocommit_block():
+        op.execute(f'CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_store_location_knn ON store USING gist ({LOCATION})')
+        op.drop_index('ix_store_location', table_name='store', postgresql_concurrently=True, if_exists=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index('ix_store_location', 'store', ['latitude', 'longitude'], unique=False,
+                        postgresql_concurrently=True, if_not_exists=True)
+        op.drop_index('ix_store_location_knn', table_name='store', postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,67 @@
+"""rating aggregates
+
+Revision ID: f58c0a2e4b17
+Revises: e27b5d9c3a61
+Create Date: 2026-10-18 14:48:20.630457
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f58c0a2e4b17'
+down_revision: Union[str, None] = 'e27b5d9c3a61'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# enum хранится именами (rating1..rating5)
+STARS = "CASE rating WHEN 'rating1' THEN 1 WHEN 'rating2' THEN 2 WHEN 'rating3' THEN 3 " \
+        "WHEN 'rating4' THEN 4 WHEN 'rating5' THEN 5 END"
+
+
+def aggregate_columns():
+    return [
+        sa.Column('review_count', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('rating_sum', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('star_1', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('star_2', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('star_3', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('star_4', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('star_5', sa.Integer(), server_default='0', nullable=False),
+    ]
+
+
+def backfill(table, key, review_table):
+    op.execute(f"INSERT INTO {table} ({key}, review_count, rating_sum, star_1, star_2, star_3, star_4, star_5) "
+               f"SELECT {key}, count(*), sum({STARS}), "
+               + ', '.join(f"count(*) FILTER (WHERE {STARS} = {star})" for star in range(1, 6))
+               + f" FROM {review_table} WHERE {key} IS NOT NULL GROUP BY {key}")
+
+
+def upgrade() -> None:
+    op.add_column('courier_review', sa.Column('courier_id', sa.Integer(), nullable=True))
+    op.create_foreign_key('courier_review_courier_id_fkey', 'courier_review', 'user_profiles', ['courier_id'], ['id'])
+    op.create_table('store_rating',
+    sa.Column('store_id', sa.Integer(), nullable=False),
+    *aggregate_columns(),
+    sa.ForeignKeyConstraint(['store_id'], ['store.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('store_id')
+    )
+    op.create_table('courier_rating',
+    sa.Column('courier_id', sa.Integer(), nullable=False),
+    *aggregate_columns(),
+    sa.ForeignKeyConstraint(['courier_id'], ['user_profiles.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('courier_id')
+    )
+    backfill('store_rating', 'store_id', 'store_review')
+    backfill('courier_rating', 'courier_id', 'courier_review')
+
+
+def downgrade() -> None:
+    op.drop_table('courier_rating')
+    op.drop_table('store_rating')
+    op.drop_constraint('courier_review_courier_id_fkey', 'courier_review', type_='foreignkey')
+    op.drop_column('courier_review', 'courier_id')
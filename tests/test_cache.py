@@ -0,0 +1,57 @@
+import asyncio
+from uuid import uuid4
+
+import pytest
+
+from glovo_app import cache
+
+
+async def test_fill_started_before_write_is_not_served_after_it(app):
+    object_id = uuid4().hex
+    loading, release = asyncio.Event(), asyncio.Event()
+
+    async def stale_loader():
+        # читатель прочитал строку до коммита записи и кладет ее в кеш уже после invalidate
+        loading.set()
+        await release.wait()
+        return {'version': 1}
+
+    async def fresh_loader():
+        return {'version': 2}
+
+    reader = asyncio.create_task(cache.cached_object('test', object_id, 300, stale_loader))
+    await loading.wait()
+    await cache.invalidate('test', object_id)
+    release.set()
+    assert await reader == {'version': 1}
+
+    assert await cache.cached_object('test', object_id, 300, fresh_loader) == {'version': 2}
+
+
+async def test_invalidate_many_moves_every_key(app):
+    ids = [uuid4().hex for _ in range(3)]
+    for object_id in ids:
+        await cache.cached_object('test', object_id, 300, lambda: asyncio.sleep(0, {'version': 1}))
+    await cache.invalidate_many('test', ids)
+    for object_id in ids:
+        assert await cache.cached_object('test', object_id, 300, lambda: asyncio.sleep(0, {'version': 2})) == \
+            {'version': 2}
+
+
+@pytest.mark.parametrize('background', [False, True])
+async def test_store_delete_drops_cached_children(client, background):
+    store = {'id': 0, 'store_name': f'test {uuid4().hex[:8]}', 'store_description': '-', 'address': '-',
+             'owner_id': 1, 'category_id': 1}
+    store_id = (await client.post('/store/store/create/', json=store)).json()['id']
+    product = {'id': 0, 'product_name': 'лагман', 'product_description': '-', 'price': 300, 'store_id': store_id}
+    product_id = (await client.post('/product/product/create/', json=product)).json()['id']
+    paths = [f'/store/store/{store_id}/', f'/store/{store_id}/menu/', f'/product/product/{product_id}/']
+    # прогреваем detail- и menu-ключи
+    for path in paths:
+        assert (await client.get(path)).status_code == 200
+
+    # продукт удаляет ON DELETE CASCADE (или фоновая чистка), приложение его не загружает
+    response = await client.delete(f'/store/store/{store_id}/', params={'background': background})
+    assert response.status_code == (202 if background else 200)
+    for path in paths:
+        assert (await client.get(path)).status_code == 404, path
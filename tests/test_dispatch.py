@@ -0,0 +1,54 @@
+from uuid import uuid4
+
+from sqlalchemy import insert, select
+
+from glovo_app.db.models import Courier, CourierStatus, OrderStatus, UserProfile, UserRole
+from glovo_app.dispatch import dispatch_once
+
+DELIVERING, DELIVERED = OrderStatus.tim2.value, OrderStatus.tim3.value
+# далеко от засеянных заказов и курьеров (Бишкек): заказ здесь может достаться только своему курьеру
+REMOTE = {'delivery_latitude': 40.5, 'delivery_longitude': 72.8}
+
+
+def add_courier(db_engine) -> int:
+    with db_engine.begin() as conn:
+        user_id = conn.scalar(insert(UserProfile)
+                              .values(first_name='courier', last_name='remote', username=f'c{uuid4().hex[:30]}',
+                                      hashed_password='-', role=UserRole.cour)
+                              .returning(UserProfile.id))
+        conn.execute(insert(Courier).values(courier_id=user_id, status_courier=CourierStatus.cour1,
+                                            latitude=REMOTE['delivery_latitude'],
+                                            longitude=REMOTE['delivery_longitude']))
+    return user_id
+
+
+def courier_status(db_engine, user_id: int) -> CourierStatus:
+    with db_engine.connect() as conn:
+        return conn.scalar(select(Courier.status_courier).where(Courier.courier_id == user_id))
+
+
+async def order(client, order_id: int) -> dict:
+    return (await client.get(f'/order/order/{order_id}/')).json()
+
+
+async def test_delivered_order_frees_courier_for_next_dispatch(client, create_order, db_engine):
+    # фоновый dispatcher из lifespan может успеть раньше — проверяется состояние, а не результат dispatch_once
+    courier_id = add_courier(db_engine)
+    first = await create_order(**REMOTE)
+    await dispatch_once()
+    first = await order(client, first['id'])
+    assert (first['role'], first['courier_id']) == (DELIVERING, courier_id)
+    assert courier_status(db_engine, courier_id) == CourierStatus.cour2
+
+    # единственный курьер рядом занят
+    second = await create_order(**REMOTE)
+    await dispatch_once()
+    assert (await order(client, second['id']))['courier_id'] is None
+
+    response = await client.post(f'/order/order/{first["id"]}/transition/', json={'role': DELIVERED})
+    assert response.status_code == 200
+    assert courier_status(db_engine, courier_id) == CourierStatus.cour1
+
+    await dispatch_once()
+    second = await order(client, second['id'])
+    assert (second['role'], second['courier_id']) == (DELIVERING, courier_id)
@@ -0,0 +1,8 @@
+from benchmarks.explain import explain_all
+
+
+def test_endpoint_queries_use_indexes(db_engine):
+    # enable_seqscan = off: на маленькой тестовой базе планировщик иначе честно выбрал бы Seq Scan
+    plans = explain_all(db_engine, min_rows=0, force_index=True)
+    seq_scans = {name: scans for name, (_, scans) in plans.items() if scans}
+    assert seq_scans == {}
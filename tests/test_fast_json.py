@@ -0,0 +1,16 @@
+import json
+from decimal import Decimal
+
+from fastapi import Response
+
+from glovo_app.db.schema import ProductListSchema, ProductComboListSchema
+from glovo_app.fast_json import fast_list_response
+
+
+def test_decimal_prices_are_listed():
+    # DECIMAL(8, 2) приходит из базы как Decimal, из кеша — как float
+    rows = [{'id': 1, 'product_name': 'лагман', 'price': Decimal('12.50'), 'store_id': 1},
+            {'id': 2, 'product_name': 'плов', 'price': 300.0, 'store_id': 1}]
+    for schema in (ProductListSchema, ProductComboListSchema):
+        items = json.loads(fast_list_response(schema, rows, Response()).body)
+        assert [item['price'] for item in items] == [12.5, 300.0]
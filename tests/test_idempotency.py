@@ -0,0 +1,83 @@
+import json
+from datetime import datetime
+from uuid import uuid4
+
+from fastapi import Response
+from fastapi.responses import JSONResponse
+from sqlalchemy import func, select
+
+from glovo_app import idempotency
+from glovo_app.db.models import Order, OrderStatus
+from glovo_app.db.schema import OrderSchema
+
+CREATE = '/order/order/create/'
+
+
+def order_payload(address: str) -> dict:
+    return {'id': 0, 'delivery_address': address, 'created_date': datetime.utcnow().isoformat(), 'role': OrderStatus.tim1.value}
+
+
+def count_orders(db_engine, address: str) -> int:
+    with db_engine.connect() as conn:
+        return conn.scalar(select(func.count()).select_from(Order).where(Order.delivery_address == address))
+
+
+async def test_replay_returns_stored_response(client, db_engine):
+    key, payload = uuid4().hex, order_payload(f'replay {uuid4().hex}')
+    first = await client.post(CREATE, json=payload, headers={'Idempotency-Key': key})
+    second = await client.post(CREATE, json=payload, headers={'Idempotency-Key': key})
+
+    assert first.status_code == second.status_code == 200
+    assert idempotency.REPLAY_HEADER not in first.headers
+    assert second.headers[idempotency.REPLAY_HEADER] == 'true'
+    assert second.json() == first.json()
+    assert count_orders(db_engine, payload['delivery_address']) == 1
+
+
+async def test_same_key_other_payload_is_rejected(client):
+    key = uuid4().hex
+    assert (await client.post(CREATE, json=order_payload('first'), headers={'Idempotency-Key': key})).status_code == 200
+    response = await client.post(CREATE, json=order_payload('second'), headers={'Idempotency-Key': key})
+    assert response.status_code == 422
+
+
+async def test_in_progress_duplicate_times_out_with_409(client, redis_client, db_engine, monkeypatch):
+    key, payload = uuid4().hex, order_payload(f'pending {uuid4().hex}')
+    # первый запрос "еще выполняется": ключ занят тем же отпечатком и не дописан
+    fingerprint = idempotency._fingerprint(OrderSchema(**payload))
+    await redis_client.set(f'idempotency:order:{key}', json.dumps({'state': 'pending', 'fingerprint': fingerprint}))
+    monkeypatch.setattr(idempotency, 'IDEMPOTENCY_WAIT', 0.2)
+
+    response = await client.post(CREATE, json=payload, headers={'Idempotency-Key': key})
+    assert response.status_code == 409
+    assert count_orders(db_engine, payload['delivery_address']) == 0
+
+
+async def test_error_response_is_not_stored(app, redis_client):
+    key = uuid4().hex
+    calls = []
+
+    async def create():
+        calls.append(1)
+        return JSONResponse({'detail': 'unavailable'}, status_code=503)
+
+    for _ in range(2):
+        result = await idempotency.idempotent('test', key, {'a': 1}, Response(), create)
+        assert result.status_code == 503
+    assert len(calls) == 2
+    assert await redis_client.get(f'idempotency:test:{key}') is None
+
+
+async def test_pending_claim_expires_quickly(app, redis_client):
+    key = uuid4().hex
+    redis_key = f'idempotency:test:{key}'
+    ttls = []
+
+    async def create():
+        ttls.append(await redis_client.ttl(redis_key))
+        return {'id': 1}
+
+    await idempotency.idempotent('test', key, {'a': 1}, Response(), create)
+    # упавший посреди create воркер не блокирует ключ на сутки
+    assert 0 < ttls[0] <= idempotency.IDEMPOTENCY_PENDING_TTL
+    assert await redis_client.ttl(redis_key) > idempotency.IDEMPOTENCY_PENDING_TTL
@@ -0,0 +1,71 @@
+from datetime import datetime, timedelta, timezone
+
+from glovo_app.db.models import OrderStatus
+
+PENDING, DELIVERING, DELIVERED, CANCELLED = (status.value for status in OrderStatus)
+
+
+def transition_path(order_id: int) -> str:
+    return f'/order/order/{order_id}/transition/'
+
+
+async def history(client, order_id: int) -> list:
+    response = await client.get(f'/order/order/{order_id}/history/')
+    assert response.status_code == 200
+    return response.json()
+
+
+async def test_transition_outside_graph_is_409(client, create_order):
+    order = await create_order()
+    # Ожидает обработки -> Доставлен минуя доставку
+    response = await client.post(transition_path(order['id']), json={'role': DELIVERED})
+    assert response.status_code == 409
+
+    assert (await client.post(transition_path(order['id']), json={'role': DELIVERING})).status_code == 200
+    assert (await client.post(transition_path(order['id']), json={'role': PENDING})).status_code == 409
+    events = await history(client, order['id'])
+    assert [(event['from_status'], event['to_status']) for event in events] == [(None, PENDING),
+                                                                              (PENDING, DELIVERING)]
+
+
+async def test_terminal_status_has_no_transitions(client, create_order):
+    order = await create_order()
+    assert (await client.post(transition_path(order['id']), json={'role': CANCELLED})).status_code == 200
+    for role in (PENDING, DELIVERING, DELIVERED):
+        assert (await client.post(transition_path(order['id']), json={'role': role})).status_code == 409
+
+
+async def test_invalid_transition_rolls_back_whole_batch(client, create_order):
+    first, second = await create_order(), await create_order()
+    response = await client.post('/order/transitions/', json=[
+        {'order_id': first['id'], 'role': DELIVERING},
+        {'order_id': second['id'], 'role': DELIVERED},
+    ])
+    assert response.status_code == 409
+    assert (await client.get(f'/order/order/{first["id"]}/')).json()['role'] == PENDING
+    assert len(await history(client, first['id'])) == 1
+
+
+async def test_event_times_are_utc_and_ordered(client, create_order):
+    order = await create_order()
+    # +06:00 из будущего: после перевода в UTC упирается в "сейчас", а не сдвигается на 6 часов
+    future = datetime.now(timezone(timedelta(hours=6))) + timedelta(hours=1)
+    assert (await client.post(transition_path(order['id']),
+                              json={'role': DELIVERING, 'occurred_at': future.isoformat()})).status_code == 200
+    # раньше создания заказа: встает сразу за предыдущим событием
+    backdated = datetime.now(timezone.utc) - timedelta(days=1)
+    assert (await client.post(transition_path(order['id']),
+                              json={'role': DELIVERED, 'occurred_at': backdated.isoformat()})).status_code == 200
+
+    created, delivering, delivered = [datetime.fromisoformat(event['created_date'])
+                                      for event in await history(client, order['id'])]
+    assert created <= delivering <= delivered <= datetime.utcnow()
+
+
+async def test_created_date_is_set_by_server(client, create_order):
+    # created_date — ключ партиций: дата из прошлого, без партиции и со смещением не должна давать 500
+    before = datetime.utcnow()
+    order = await create_order(created_date='2001-01-01T00:00:00Z')
+    created = datetime.fromisoformat(order['created_date'])
+    assert before <= created <= datetime.utcnow()
+    assert created.tzinfo is None
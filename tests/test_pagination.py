@@ -0,0 +1,44 @@
+from datetime import datetime
+
+from sqlalchemy import func, select
+
+from glovo_app.db.models import Order, Product
+from glovo_app.db.pagination import NEXT_CURSOR_HEADER
+
+
+async def walk(client, path: str, limit: int) -> list:
+    items, cursor = [], None
+    while True:
+        params = {'limit': limit, **({'cursor': cursor} if cursor else {})}
+        response = await client.get(path, params=params)
+        assert response.status_code == 200
+        page = response.json()
+        assert len(page) <= limit
+        items.extend(page)
+        cursor = response.headers.get(NEXT_CURSOR_HEADER)
+        if cursor is None:
+            return items
+
+
+def count(db_engine, model) -> int:
+    with db_engine.connect() as conn:
+        return conn.scalar(select(func.count()).select_from(model))
+
+
+async def test_product_cursor_walks_every_row_once(client, db_engine):
+    items = await walk(client, '/product/product/', limit=17)
+    ids = [item['id'] for item in items]
+    assert ids == sorted(set(ids))
+    assert len(ids) == count(db_engine, Product)
+
+
+async def test_order_cursor_is_newest_first(client, db_engine):
+    items = await walk(client, '/order/order/', limit=9)
+    keys = [(datetime.fromisoformat(item['created_date']), item['id']) for item in items]
+    assert keys == sorted(set(keys), reverse=True)
+    assert len(keys) == count(db_engine, Order)
+
+
+async def test_invalid_cursor_is_400(client):
+    response = await client.get('/product/product/', params={'cursor': 'not-a-cursor'})
+    assert response.status_code == 400
@@ -0,0 +1,51 @@
+import json
+from uuid import uuid4
+
+import pytest
+
+STORE_ID = 1
+
+PRODUCT = {'path': '/product/product/', 'name': 'product_name', 'description': 'product_description',
+           'image': 'product_image'}
+COMBO = {'path': '/product_combo/product_combo/', 'name': 'product_name', 'description': 'description',
+         'image': 'image'}
+
+
+def payload(kind: dict, **fields) -> dict:
+    return {'id': 0, kind['name']: f'test {uuid4().hex[:8]}', kind['description']: 'домашний',
+            'price': 12.5, 'store_id': STORE_ID, **fields}
+
+
+@pytest.mark.parametrize('kind', [PRODUCT, COMBO], ids=['product', 'combo'])
+async def test_create_detail_update_use_schema_fields(client, kind):
+    # без картинки и с дробной ценой: DECIMAL(8, 2) и nullable image
+    response = await client.post(f'{kind["path"]}create/', json=payload(kind))
+    assert response.status_code == 200, response.text
+    created = response.json()
+    assert (created['price'], created[kind['image']]) == (12.5, None)
+
+    detail = await client.get(f'{kind["path"]}{created["id"]}/')
+    assert detail.status_code == 200
+    assert detail.json() == created
+
+    response = await client.put(f'{kind["path"]}{created["id"]}/',
+                                json=payload(kind, **{kind['description']: 'острый', 'price': 99.99}))
+    assert response.status_code == 200
+    updated = (await client.get(f'{kind["path"]}{created["id"]}/')).json()
+    assert (updated[kind['description']], updated['price']) == ('острый', 99.99)
+
+
+@pytest.mark.parametrize('kind', [PRODUCT, COMBO], ids=['product', 'combo'])
+@pytest.mark.parametrize('file_format, content_type', [('ndjson', 'application/x-ndjson'), ('csv', 'text/csv')])
+async def test_export_can_be_imported_again(client, kind, file_format, content_type):
+    await client.post(f'{kind["path"]}create/', json=payload(kind))
+    exported = await client.get(f'{kind["path"]}export/', params={'format': file_format})
+    assert exported.status_code == 200
+    if file_format == 'ndjson':
+        records = [json.loads(line) for line in exported.text.splitlines()]
+        assert any(record[kind['image']] is None for record in records)
+
+    response = await client.post(f'{kind["path"]}import/', content=exported.content,
+                                 headers={'content-type': content_type})
+    assert response.status_code == 200, response.text
+    assert response.json()['count'] == len(exported.text.strip().splitlines()) - (file_format == 'csv')
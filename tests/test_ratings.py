@@ -0,0 +1,55 @@
+from datetime import datetime
+
+from sqlalchemy import select
+
+from glovo_app.db.models import StoreRating, CourierRating
+
+STORE_ID = 1
+# курьеры в benchmarks.seed идут после 50 пользователей
+COURIER_ID = 51
+
+
+def review(**fields):
+    return {'client_id': 2, 'created_date': datetime.utcnow().isoformat(), 'comment': 'быстро и вкусно',
+            'rating': '4', **fields}
+
+
+def aggregate(db_engine, model, key_column, key):
+    with db_engine.connect() as conn:
+        return conn.execute(select(model).where(key_column == key)).one_or_none()
+
+
+async def test_store_review_create_updates_aggregate(client, db_engine):
+    before = aggregate(db_engine, StoreRating, StoreRating.store_id, STORE_ID)
+    response = await client.post('/store_review/store_review/create/', json=review(store_id=STORE_ID))
+    assert response.status_code == 200
+    assert response.json()['comment'] == 'быстро и вкусно'
+
+    after = aggregate(db_engine, StoreRating, StoreRating.store_id, STORE_ID)
+    assert after.review_count == (before.review_count if before else 0) + 1
+    assert after.star_4 == (before.star_4 if before else 0) + 1
+    assert after.rating_sum == (before.rating_sum if before else 0) + 4
+
+    summary = (await client.get(f'/store_review/rating/{STORE_ID}/')).json()
+    assert summary['review_count'] == after.review_count
+    assert summary['histogram']['4'] == after.star_4
+
+
+async def test_courier_review_create_updates_aggregate(client, db_engine):
+    before = aggregate(db_engine, CourierRating, CourierRating.courier_id, COURIER_ID)
+    response = await client.post('/courier_review/courier_review/create/',
+                                 json=review(courier_id=COURIER_ID, rating='2'))
+    assert response.status_code == 200
+    assert response.json()['client_id'] is None
+
+    after = aggregate(db_engine, CourierRating, CourierRating.courier_id, COURIER_ID)
+    assert after.review_count == (before.review_count if before else 0) + 1
+    assert after.star_2 == (before.star_2 if before else 0) + 1
+
+
+async def test_review_created_date_is_set_by_server(client):
+    before = datetime.utcnow()
+    response = await client.post('/store_review/store_review/create/',
+                                 json=review(store_id=STORE_ID, created_date='2001-01-01T00:00:00+06:00'))
+    assert response.status_code == 200
+    assert before <= datetime.fromisoformat(response.json()['created_date']) <= datetime.utcnow()
@@ -0,0 +1,25 @@
+import time
+
+from glovo_app.db.schema import UserProfileSchema
+from glovo_app.token_cache import TokenCache
+
+
+def user(user_id: int) -> UserProfileSchema:
+    return UserProfileSchema(id=user_id, first_name='a', last_name='b', username=f'user{user_id}', role='клиент')
+
+
+def test_entry_expires_after_ttl_even_if_token_lives_longer():
+    cache = TokenCache(max_size=10, ttl=0)
+    cache.set('token', time.time() + 3600, user(1))
+    assert cache.get('token') is None
+
+
+def test_invalidate_user_drops_all_of_their_tokens():
+    cache = TokenCache(max_size=10, ttl=60)
+    exp = time.time() + 3600
+    cache.set('first', exp, user(1))
+    cache.set('second', exp, user(1))
+    cache.set('other', exp, user(2))
+    cache.invalidate_user(1)
+    assert cache.get('first') is None and cache.get('second') is None
+    assert cache.get('other').id == 2
@@ -0,0 +1,58 @@
+STORE_ID = 2
+
+
+async def test_order_if_match(client, create_order):
+    order = await create_order()
+    path = f'/order/order/{order["id"]}/'
+    detail = await client.get(path)
+    etag = detail.headers['ETag']
+    assert etag == '"1"'
+
+    updated = await client.patch(path, json={'delivery_address': 'новый адрес'}, headers={'If-Match': etag})
+    assert updated.status_code == 200
+    assert updated.headers['ETag'] == '"2"'
+
+    # второй клиент со старым ETag не затирает чужую правку
+    stale = await client.patch(path, json={'delivery_address': 'старый клиент'}, headers={'If-Match': etag})
+    assert stale.status_code == 412
+    stale_put = await client.put(path, json={**detail.json(), 'delivery_address': 'старый клиент'},
+                                 headers={'If-Match': etag})
+    assert stale_put.status_code == 412
+    assert (await client.get(path)).json()['delivery_address'] == 'новый адрес'
+
+
+async def test_order_invalid_if_match(client, create_order):
+    order = await create_order()
+    response = await client.patch(f'/order/order/{order["id"]}/', json={'delivery_address': 'x'},
+                                  headers={'If-Match': 'not-a-version'})
+    assert response.status_code == 412
+
+
+async def test_store_etag_follows_cached_detail(client):
+    path = f'/store/store/{STORE_ID}/'
+    # первый GET кладет строку в кеш, второй отдает ее из Redis
+    etag = (await client.get(path)).headers['ETag']
+    assert (await client.get(path)).headers['ETag'] == etag
+
+    updated = await client.patch(path, json={'store_name': 'переименован'}, headers={'If-Match': etag})
+    assert updated.status_code == 200
+    new_etag = updated.headers['ETag']
+    assert new_etag != etag
+
+    detail = await client.get(path)
+    assert detail.headers['ETag'] == new_etag
+    assert detail.json()['store_name'] == 'переименован'
+    assert (await client.patch(path, json={'store_name': 'опоздал'}, headers={'If-Match': etag})).status_code == 412
+
+
+async def test_patch_uses_schema_field_names_and_rejects_null(client, create_order):
+    path = f'/store/store/{STORE_ID}/'
+    updated = await client.patch(path, json={'store_description': 'новое описание'})
+    assert updated.status_code == 200
+    assert (await client.get(path)).json()['store_description'] == 'новое описание'
+
+    # NOT NULL колонки: 422 до базы; nullable поле можно обнулить
+    assert (await client.patch(path, json={'store_name': None})).status_code == 422
+    assert (await client.patch(path, json={'store_image': None})).status_code == 200
+    order = await create_order()
+    assert (await client.patch(f'/order/order/{order["id"]}/', json={'delivery_address': None})).status_code == 422